@@ -0,0 +1,240 @@
+import collections
+import json
+import os
+import threading
+import time
+from atomicfile import atomic_write_json
+
+ALERT_STATE_FILE = 'alert_state.json'
+
+UP = 'UP'
+SUSPECT = 'SUSPECT'
+DOWN = 'DOWN'
+RECOVERING = 'RECOVERING'
+
+# A site is confirmed DOWN when CONFIRM_FAILURES of its last CONFIRM_WINDOW probes failed,
+# and UP again only after RECOVER_SUCCESSES successes in a row (hysteresis).
+CONFIRM_FAILURES = 2
+CONFIRM_WINDOW = 3
+RECOVER_SUCCESSES = 2
+
+# While a site stays DOWN, a reminder is sent this often (seconds)
+REMINDER_INTERVAL = 3600
+
+# A site that goes down/up FLAP_TRANSITIONS times within FLAP_WINDOW seconds is flapping:
+# one 'flapping' alert replaces its individual down/recovered alerts until it settles
+FLAP_TRANSITIONS = 4
+FLAP_WINDOW = 3600
+
+# Recent alerts kept for the web API
+RECENT_ALERTS = 200
+
+# The tray and web apps share the state file: saves take a lock file (waiting up to
+# LOCK_TIMEOUT seconds; one older than LOCK_STALE seconds was left by a crashed process)
+LOCK_TIMEOUT = 5
+LOCK_STALE = 30
+
+
+class SiteAlertState:
+    __slots__ = ('state', 'since', 'checked', 'outcomes', 'streak', 'error', 'last_alert', 'transitions', 'flapping')
+
+    def __init__(self, now):
+        self.state = UP
+        self.since = now
+        # Time of the last observed probe; the newer copy wins when state files are merged
+        self.checked = None
+        self.outcomes = []
+        self.streak = 0
+        self.error = None
+        self.last_alert = None
+        self.transitions = []
+        self.flapping = False
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data.get('since', time.time()))
+        for field in cls.__slots__:
+            if field in data:
+                setattr(state, field, data[field])
+        return state
+
+
+class AlertEngine:
+    """Per-site UP -> SUSPECT -> DOWN -> RECOVERING state machine deciding when to alert.
+
+    A single failure only makes a site SUSPECT; it takes N-of-M failed probes to confirm
+    it DOWN, and several successes in a row before it counts as UP again. Alerts are
+    raised on confirmed transitions (down / recovered), as reminders while a site stays
+    down, and once when a site starts flapping, never once per failed sweep. State is
+    kept in a JSON file so a restart doesn't re-alert every site that is already down.
+    """
+
+    def __init__(self, path=ALERT_STATE_FILE, confirm_failures=CONFIRM_FAILURES, confirm_window=CONFIRM_WINDOW,
+                 recover_successes=RECOVER_SUCCESSES, reminder_interval=REMINDER_INTERVAL):
+        self.path = path
+        self.confirm_failures = confirm_failures
+        self.confirm_window = confirm_window
+        self.recover_successes = recover_successes
+        self.reminder_interval = reminder_interval
+        self.recent = collections.deque(maxlen=RECENT_ALERTS)
+        self._lock = threading.Lock()
+        self._dirty = False
+        # Sites dropped by retain(), left out of the file even if another process wrote them
+        self._removed = set()
+        self._sites = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {name: SiteAlertState.from_dict(data) for name, data in json.load(f).items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def _transition(self, site, state, now):
+        site.state = state
+        site.since = now
+
+    def observe(self, name, success, error=None, now=None):
+        """Feeds one probe outcome; returns the alert it triggers (a dict) or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            site = self._sites.get(name)
+            if site is None:
+                site = self._sites[name] = SiteAlertState(now)
+            self._dirty = True
+            self._removed.discard(name)
+            site.checked = now
+            previous = site.state
+            site.outcomes = (site.outcomes + [bool(success)])[-self.confirm_window:]
+            site.streak = site.streak + 1 if success else 0
+            if not success:
+                site.error = error
+            failures = site.outcomes.count(False)
+
+            if site.state in (UP, SUSPECT):
+                if failures >= self.confirm_failures:
+                    self._transition(site, DOWN, now)
+                elif failures and site.state == UP:
+                    self._transition(site, SUSPECT, now)
+                elif not failures and site.state == SUSPECT:
+                    self._transition(site, UP, now)
+            elif site.state == DOWN:
+                if success:
+                    self._transition(site, UP if site.streak >= self.recover_successes else RECOVERING, now)
+            elif site.state == RECOVERING:
+                if not success:
+                    # Still the same outage: back to DOWN without a new alert
+                    site.state = DOWN
+                elif site.streak >= self.recover_successes:
+                    self._transition(site, UP, now)
+
+            kind = None
+            if site.state == DOWN and previous in (UP, SUSPECT):
+                kind = 'down'
+            elif site.state == UP and previous in (DOWN, RECOVERING):
+                kind = 'recovered'
+            elif site.state == DOWN and site.last_alert is not None and now - site.last_alert >= self.reminder_interval:
+                kind = 'reminder'
+
+            if kind in ('down', 'recovered'):
+                site.transitions = [t for t in site.transitions if now - t < FLAP_WINDOW] + [now]
+                if site.flapping:
+                    kind = None
+                elif len(site.transitions) >= FLAP_TRANSITIONS:
+                    site.flapping = True
+                    kind = 'flapping'
+            elif site.flapping and not any(now - t < FLAP_WINDOW for t in site.transitions):
+                site.flapping = False
+                # Settled while down: the down alerts it suppressed are now due
+                if site.state == DOWN:
+                    kind = 'down'
+
+            if kind is None:
+                return None
+            site.last_alert = now
+            alert = {'site': name, 'kind': kind, 'state': site.state, 'since': site.since,
+                     'error': site.error if site.state != UP else None, 'time': now}
+            self.recent.append(alert)
+            return alert
+
+    def observe_sweep(self, results, now=None):
+        """Feeds a sweep's results (dicts with name, success, error); returns the alerts raised."""
+        now = time.time() if now is None else now
+        alerts = [self.observe(r['name'], r['success'], r.get('error'), now) for r in results]
+        return [alert for alert in alerts if alert is not None]
+
+    def state_of(self, name):
+        site = self._sites.get(name)
+        return UP if site is None else site.state
+
+    def status(self):
+        """Returns {name: {state, since, error, flapping}} for every site seen."""
+        with self._lock:
+            return {
+                name: {'state': site.state, 'since': site.since, 'flapping': site.flapping,
+                       'error': site.error if site.state != UP else None}
+                for name, site in self._sites.items()
+            }
+
+    def retain(self, names):
+        """Drops the state of sites not in names (no longer monitored)."""
+        names = set(names)
+        with self._lock:
+            for name in [name for name in self._sites if name not in names]:
+                del self._sites[name]
+                self._removed.add(name)
+                self._dirty = True
+
+    def _acquire_file_lock(self):
+        lock_path = f"{self.path}.lock"
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return lock_path
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > LOCK_STALE:
+                        os.unlink(lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Alert state file is locked: {lock_path}")
+                time.sleep(0.05)
+
+    def save(self):
+        """Merges with the state file and writes it back, if anything changed.
+
+        Other processes (tray, web) may have written the file since: under a lock file, it
+        is re-read and each site keeps whichever copy was observed last, in memory too, so
+        the apps converge on one state instead of overwriting each other's. The file is
+        replaced atomically (see atomic_write_json). Raises OSError if it can't be written.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        lock_path = None
+        try:
+            lock_path = self._acquire_file_lock()
+            on_disk = self._read()
+            with self._lock:
+                for name, theirs in on_disk.items():
+                    ours = self._sites.get(name)
+                    if ours is not None and (theirs.checked or 0) > (ours.checked or 0):
+                        self._sites[name] = theirs
+                merged = {name: site for name, site in on_disk.items() if name not in self._removed}
+                merged.update(self._sites)
+                data = {name: site.to_dict() for name, site in merged.items()}
+            atomic_write_json(self.path, data)
+        except OSError:
+            # Written again at the next save
+            self._dirty = True
+            raise
+        finally:
+            if lock_path is not None:
+                os.unlink(lock_path)
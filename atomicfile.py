@@ -0,0 +1,23 @@
+import json
+import os
+import tempfile
+
+
+def atomic_write_json(path, data, **options):
+    """Writes data to path as JSON, atomically (options go to json.dump).
+
+    The JSON goes to a unique temporary file next to path, which is then renamed over it:
+    a reader (or a crash mid-write) never sees half a file, and processes sharing the file
+    can't clobber each other's temporary copy. Raises OSError if it can't be written.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, **options)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,268 @@
+import asyncio
+import collections
+import json
+import math
+import time
+import uuid
+from urllib.parse import urlsplit
+from monitor import (AdaptiveTimeoutPolicy, HostRateLimiter, classify_error, describe_exception,
+                     translate_error)
+
+# Upper bound on URLs in one job
+BATCH_MAX_URLS = 20000
+# Probes one job runs at once (default and maximum). Dashboard sweeps share the monitor's
+# MAX_CONCURRENCY slots, so a few running jobs together must leave most of them free.
+BATCH_CONCURRENCY = 10
+BATCH_MAX_CONCURRENCY = 30
+# Seconds a job may run before its remaining URLs are given up (default and maximum)
+BATCH_DEADLINE = 600
+BATCH_MAX_DEADLINE = 3600
+# Jobs running at the same time; later ones wait in the queue
+BATCH_WORKERS = 2
+# Jobs kept (queued, running or finished); finished jobs are dropped oldest first, after BATCH_JOB_TTL seconds
+BATCH_MAX_JOBS = 50
+BATCH_JOB_TTL = 3600
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+EXPIRED = 'expired'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, EXPIRED, CANCELLED)
+
+
+def _entry(item):
+    """Returns (name, url) for one uploaded entry: a URL, a "name url" line or a {name, url} dict."""
+    if isinstance(item, dict):
+        url = str(item.get('url') or '').strip()
+        name = str(item.get('name') or '').strip() or url
+    else:
+        parts = str(item).split()
+        if not parts:
+            return None
+        url = parts[-1]
+        name = ' '.join(parts[:-1]) or url
+    if urlsplit(url).scheme not in ('http', 'https') or not urlsplit(url).netloc:
+        raise ValueError(f"올바른 URL이 아닙니다: {url}")
+    return name, url
+
+
+def parse_batch(body, content_type=''):
+    """Parses an upload into (entries, options).
+
+    JSON bodies are a list of entries or {"urls": [...], "concurrency": n, "deadline": s};
+    anything else is read as newline-delimited "url" or "name url" lines (blank lines and
+    "#" comments skipped). Raises ValueError with a user-facing message if it is unusable.
+    """
+    text = body.decode('utf-8-sig') if isinstance(body, bytes) else body
+    options = {}
+    if 'json' in content_type or text.lstrip()[:1] in ('[', '{'):
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"JSON 형식이 올바르지 않습니다: {e}")
+        if isinstance(data, dict):
+            options = {key: data[key] for key in ('concurrency', 'deadline') if data.get(key) is not None}
+            data = data.get('urls', [])
+        if not isinstance(data, list):
+            raise ValueError("URL 목록 형식이 올바르지 않습니다")
+        items = data
+    else:
+        items = [line for line in text.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+
+    for key, value in options.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+            raise ValueError(f"{key} 값이 올바르지 않습니다: {value!r}")
+
+    entries = [entry for entry in map(_entry, items) if entry is not None]
+    if not entries:
+        raise ValueError("검사할 URL이 없습니다")
+    if len(entries) > BATCH_MAX_URLS:
+        raise ValueError(f"URL이 너무 많습니다 (최대 {BATCH_MAX_URLS}개)")
+    return entries, options
+
+
+class BatchJob:
+    """One uploaded URL list and its results so far (in completion order)."""
+
+    def __init__(self, entries, concurrency=BATCH_CONCURRENCY, deadline=BATCH_DEADLINE):
+        self.id = uuid.uuid4().hex[:12]
+        self.entries = entries
+        self.concurrency = max(1, min(int(concurrency), BATCH_MAX_CONCURRENCY))
+        self.deadline = max(1.0, min(float(deadline), BATCH_MAX_DEADLINE))
+        self.state = QUEUED
+        self.results = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def summary(self):
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'total': len(self.entries),
+            'completed': len(self.results),
+            'failed': sum(1 for r in self.results if not r['success']),
+            'concurrency': self.concurrency,
+            'deadline': self.deadline,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+    async def _publish(self, result=None, state=None):
+        async with self.changed:
+            if result is not None:
+                self.results.append(result)
+            if state is not None:
+                self.state = state
+            self.changed.notify_all()
+
+    @staticmethod
+    def _failure(error, error_class):
+        return {'success': False, 'error': error, 'error_class': error_class, 'status_code': None,
+                'latency_ms': None, 'checked_at': time.time()}
+
+    async def run(self, monitor):
+        """Probes the job's URLs with at most `concurrency` in flight, until done or the deadline."""
+        self.started_at = time.time()
+        await self._publish(state=RUNNING)
+        pending = iter(enumerate(self.entries))
+        # The job's own timeout statistics, retry budget and host buckets, dropped with it: a list
+        # of dead URLs must not use up the retries and rate limits of the monitored sites
+        policy = AdaptiveTimeoutPolicy()
+        rate_limiter = HostRateLimiter(overrides=monitor.rate_limiter.overrides)
+
+        async def worker():
+            # A fixed set of workers pulling from one iterator, rather than a task per URL
+            for index, (name, url) in pending:
+                try:
+                    result = await monitor.probe_async(url, policy, rate_limiter, adhoc=True)
+                except Exception as e:
+                    # One malformed URL must not end the job
+                    result = self._failure(translate_error(describe_exception(e)), classify_error(e))
+                await self._publish({'index': index, 'name': name, 'url': url, **result})
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.concurrency, len(self.entries)))]
+        state = DONE
+        try:
+            _, not_done = await asyncio.wait(workers, timeout=self.deadline)
+            if not_done:
+                state = EXPIRED
+        except asyncio.CancelledError:
+            state = CANCELLED
+            raise
+        finally:
+            for task in workers:
+                task.cancel()
+            if state != DONE:
+                # URLs that never got an answer are reported, so results always cover the whole list
+                error, error_class = (("작업 시간 제한을 초과했습니다 (Batch deadline exceeded)", 'deadline')
+                                      if state == EXPIRED else ("작업이 취소되었습니다 (Batch cancelled)", 'cancelled'))
+                answered = {r['index'] for r in self.results}
+                for index, (name, url) in enumerate(self.entries):
+                    if index not in answered:
+                        self.results.append({'index': index, 'name': name, 'url': url,
+                                             **self._failure(error, error_class)})
+            self.finished_at = time.time()
+            await asyncio.shield(self._publish(state=state))
+
+    async def stream(self, offset=0):
+        """Yields each result from `offset` on as it arrives, until the job finishes."""
+        sent = offset
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.finished or len(self.results) > sent)
+                pending = self.results[sent:]
+                finished = self.finished
+            for result in pending:
+                yield result
+            sent += len(pending)
+            if finished:
+                return
+
+
+class BatchQueue:
+    """Queue of ad-hoc batch jobs, run BATCH_WORKERS at a time on the monitor's probe engine.
+
+    Jobs probe with their own concurrency cap, so a large audit neither starves the
+    interactive dashboard's sweeps nor the other jobs. Results are never written to the
+    probe history or alert states: those are for the monitored site list only.
+    """
+
+    def __init__(self, monitor, workers=BATCH_WORKERS, max_jobs=BATCH_MAX_JOBS, job_ttl=BATCH_JOB_TTL):
+        self.monitor = monitor
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.job_ttl = job_ttl
+        self.jobs = collections.OrderedDict()
+        self._queue = None
+        self._workers = []
+
+    def start(self):
+        """Starts the worker tasks on the running loop."""
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        for job in self.jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+        await asyncio.gather(*self._workers, *(job.task for job in self.jobs.values() if job.task is not None),
+                             return_exceptions=True)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            if job.finished:
+                # Cancelled while still queued
+                continue
+            job.task = asyncio.ensure_future(job.run(self.monitor))
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    raise
+            except Exception as e:
+                self.monitor.log_error(f"Batch job {job.id} failed: {e}", event='batch_fail')
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and (len(self.jobs) >= self.max_jobs or now - job.finished_at > self.job_ttl):
+                del self.jobs[job_id]
+
+    def submit(self, entries, concurrency=None, deadline=None):
+        """Queues a job and returns it; raises OverflowError when too many jobs are pending."""
+        self._prune()
+        if len(self.jobs) >= self.max_jobs:
+            raise OverflowError("대기 중인 일괄 검사 작업이 너무 많습니다. 잠시 후 다시 시도하세요.")
+        job = BatchJob(entries, concurrency or BATCH_CONCURRENCY, deadline or BATCH_DEADLINE)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def position(self, job):
+        """Number of jobs queued ahead of this one (0 once it runs)."""
+        if job.state != QUEUED:
+            return 0
+        return sum(1 for other in self.jobs.values() if other.state == QUEUED and other.created_at < job.created_at)
+
+    async def cancel(self, job):
+        if job.task is not None:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        elif not job.finished:
+            job.finished_at = time.time()
+            await job._publish(state=CANCELLED)
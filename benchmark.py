@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from aiohttp import web
+from monitor import WebsiteMonitor, REQUEST_TIMEOUT
+from history import percentile
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage, peak RSS is not reported
+    resource = None
+
+# Kinds of fake site served by the farm, and the verdict the monitor should reach for each
+SITE_KINDS = {
+    'fast': True,
+    'slow': True,
+    'waf': True,     # rejects non-browser requests with 400, like the goedy.kr portal
+    'hang': False,   # never answers: exercises the timeout path
+    '4xx': False,
+    '5xx': False,
+    'tls': False,    # https:// against the plain-HTTP port: TLS handshake error
+}
+
+# Share of each kind in a generated site list (percent)
+DEFAULT_MIX = {'fast': 70, 'slow': 10, 'waf': 3, 'hang': 4, '4xx': 5, '5xx': 5, 'tls': 3}
+DEFAULT_SIZES = (25, 100, 1000, 10000)
+DEFAULT_ENGINES = ('async',)
+SLOW_DELAY = 1.0
+
+# Thread/fd sampling period during a sweep
+SAMPLE_INTERVAL = 0.05
+
+# Startup profile: entry points imported in a fresh interpreter STARTUP_RUNS times each
+# (after one warm-up run that writes the .pyc files), with the slowest packages listed
+STARTUP_MODULES = ('tray_app', 'daemon', 'main', 'mobile_main')
+STARTUP_RUNS = 5
+STARTUP_TOP = 8
+# The imports run in a scratch directory, since main creates its history database and reads
+# its state files at import time; only these inputs are copied there, so startup still
+# loads the real site list. State path overrides are dropped from the environment.
+STARTUP_INPUTS = ('지역교육청_url.txt', 'settings.json')
+STARTUP_ENV_DROP = ('HISTORY_DB', 'ALERT_STATE_FILE', 'SNAPSHOT_FILE')
+
+# Fake site hosts; each site gets its own host so per-host rate limits don't serialise the run
+FARM_DOMAIN = 'farm.test'
+
+PAGE = ("<!DOCTYPE html><html><head><title>교육지원청</title></head><body>"
+        + "<p>공지사항</p>" * 200 + "</body></html>").encode('utf-8')
+
+
+def make_farm_app(slow_delay=SLOW_DELAY):
+    """aiohttp app with one route per site kind (the 'tls' kind reuses /fast over https)."""
+    async def fast(request):
+        return web.Response(body=PAGE, content_type='text/html')
+
+    async def slow(request):
+        await asyncio.sleep(slow_delay)
+        return web.Response(body=PAGE, content_type='text/html')
+
+    async def hang(request):
+        await asyncio.sleep(3600)
+        return web.Response(body=PAGE, content_type='text/html')
+
+    async def not_found(request):
+        return web.Response(status=404, text="Not Found")
+
+    async def server_error(request):
+        return web.Response(status=500, text="Internal Server Error")
+
+    async def waf(request):
+        headers = request.headers
+        if (request.method == 'HEAD' or 'Mozilla' not in headers.get('User-Agent', '')
+                or 'Sec-Fetch-Mode' in headers or 'Referer' in headers):
+            return web.Response(status=400, text="Request Rejected")
+        return web.Response(body=PAGE, content_type='text/html')
+
+    app = web.Application()
+    app.add_routes([
+        web.get('/fast', fast), web.get('/slow', slow), web.get('/hang', hang),
+        web.get('/4xx', not_found), web.get('/5xx', server_error), web.route('*', '/waf', waf),
+    ])
+    return app
+
+
+def _serve_farm(port_queue, slow_delay):
+    async def serve():
+        runner = web.AppRunner(make_farm_app(slow_delay), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0, backlog=4096)
+        await site.start()
+        port_queue.put(runner.addresses[0][1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_farm(slow_delay=SLOW_DELAY):
+    """Starts the farm in its own process (so it doesn't skew the measurements); returns (process, port)."""
+    ctx = multiprocessing.get_context('spawn')
+    port_queue = ctx.Queue()
+    process = ctx.Process(target=_serve_farm, args=(port_queue, slow_delay), daemon=True)
+    process.start()
+    return process, port_queue.get(timeout=30)
+
+
+def farm_sites(n, port, mix=DEFAULT_MIX):
+    """Returns ({name: url}, {name: kind}) for n fake sites spread over the mix."""
+    kinds = []
+    for kind, share in mix.items():
+        kinds += [kind] * share
+    urls = {}
+    site_kinds = {}
+    for i in range(n):
+        # Evenly sampled from the expanded mix, so every size keeps the proportions
+        kind = kinds[i * len(kinds) // n]
+        name = f"site{i:05d}-{kind}"
+        host = f"s{i}.{FARM_DOMAIN}"
+        if kind == 'tls':
+            urls[name] = f"https://{host}:{port}/fast"
+        else:
+            urls[name] = f"http://{host}:{port}/{kind}"
+        site_kinds[name] = kind
+    return urls, site_kinds
+
+
+def open_fds():
+    """Open file descriptors of this process, where the platform exposes them."""
+    for path in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+class ResourceSampler(threading.Thread):
+    """Samples the peak thread count and open fds while a sweep runs."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak_threads = 0
+        self.peak_fds = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            fds = open_fds()
+            if fds is not None:
+                self.peak_fds = max(self.peak_fds or 0, fds)
+            self._stop_event.wait(SAMPLE_INTERVAL)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _sweep(monitor, engine):
+    """Runs one sweep with the given engine and returns its results.
+
+    The connectivity check targets the farm itself (see _run_case), so the benchmark
+    stays offline: 'async' drives
+    iter_check_async on a fresh loop, 'sync' uses iter_check as the tray and Flet apps do.
+    """
+    if engine == 'sync':
+        try:
+            return list(monitor.iter_check())
+        finally:
+            monitor.close()
+
+    async def run():
+        try:
+            return [result async for result in monitor.iter_check_async()]
+        finally:
+            await monitor.aclose()
+
+    return asyncio.run(run())
+
+
+def _run_case(engine, n, port, mix, result_queue):
+    urls, kinds = farm_sites(n, port, mix)
+    # The farm is the only "internet" here; no connects to the public reference endpoints
+    monitor = WebsiteMonitor(network_endpoints=[f'127.0.0.1:{port}'])
+    monitor.urls = urls
+    for host in monitor.get_hosts():
+        monitor.dns_cache.pin(host, '127.0.0.1')
+
+    sampler = ResourceSampler()
+    sampler.start()
+    started = time.perf_counter()
+    results = _sweep(monitor, engine)
+    wall = time.perf_counter() - started
+    sampler.stop()
+
+    latencies = sorted(r['latency_ms'] for r in results if r['success'] and r['latency_ms'] is not None)
+    outcomes = {}
+    for r in results:
+        key = 'ok' if r['success'] else r['error_class']
+        outcomes[key] = outcomes.get(key, 0) + 1
+    result_queue.put({
+        'engine': engine,
+        'sites': n,
+        'wall_s': round(wall, 3),
+        'sites_per_s': round(n / wall, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_threads': sampler.peak_threads,
+        'peak_fds': sampler.peak_fds,
+        'outcomes': outcomes,
+        # Sites whose verdict differs from what their kind should produce
+        'wrong_verdicts': sum(1 for r in results if r['success'] != SITE_KINDS[kinds[r['name']]]),
+    })
+
+
+def run_case(engine, n, port, mix=DEFAULT_MIX):
+    """Runs one sweep in a fresh process, so peak RSS/threads/fds belong to that case alone."""
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(engine, n, port, mix, result_queue))
+    process.start()
+    try:
+        # Generous bound: even a fully hanging farm finishes within a few timeouts
+        return result_queue.get(timeout=REQUEST_TIMEOUT * 4 + n / 10)
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+
+
+def import_profile(module, cwd):
+    """Imports module in a fresh interpreter under -X importtime, from the working directory cwd.
+
+    Returns (wall seconds, {top-level package: self import time in ms}), or (None, error
+    text) if the import fails, e.g. a GUI dependency missing on a server.
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = {key: value for key, value in os.environ.items() if key not in STARTUP_ENV_DROP}
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (repo, env.get('PYTHONPATH'))))
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True,
+                          text=True, cwd=cwd, env=env)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1]
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue
+        # Self times add up without double counting nested imports
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+    return wall, packages
+
+
+def run_startup(modules, runs=STARTUP_RUNS):
+    """Returns one startup case per module: median wall time, total import time and the slowest packages."""
+    cases = []
+    with tempfile.TemporaryDirectory() as cwd:
+        repo = os.path.dirname(os.path.abspath(__file__))
+        for name in STARTUP_INPUTS:
+            if os.path.exists(os.path.join(repo, name)):
+                shutil.copy(os.path.join(repo, name), cwd)
+        for module in modules:
+            wall, packages = import_profile(module, cwd)
+            if wall is None:
+                cases.append({'module': module, 'error': packages})
+                continue
+            walls = []
+            for _ in range(runs):
+                wall, packages = import_profile(module, cwd)
+                walls.append(wall)
+            top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:STARTUP_TOP]
+            cases.append({
+                'module': module,
+                'wall_ms': round(statistics.median(walls) * 1000, 1),
+                'import_ms': round(sum(packages.values()), 1),
+                'top_packages': {package: round(ms, 1) for package, ms in top},
+            })
+    return cases
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report, baseline):
+    """Prints wall time and p99 changes against a previous report."""
+    previous_startup = {c['module']: c for c in baseline.get('startup', []) if 'wall_ms' in c}
+    for case in report.get('startup', []):
+        old = previous_startup.get(case['module'])
+        if old is not None and 'wall_ms' in case:
+            print(f"  import {case['module']:<12} vs {baseline.get('revision') or 'baseline'}: "
+                  f"wall_ms {(case['wall_ms'] - old['wall_ms']) / old['wall_ms'] * 100:+.1f}%")
+    previous = {(c['engine'], c['sites']): c for c in baseline['cases']}
+    for case in report['cases']:
+        old = previous.get((case['engine'], case['sites']))
+        if old is None:
+            continue
+        changes = []
+        for key in ('wall_s', 'p99_ms', 'peak_rss_mb'):
+            if case.get(key) and old.get(key):
+                changes.append(f"{key} {(case[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  {case['engine']:>5} N={case['sites']:<6} vs {baseline.get('revision') or 'baseline'}: {', '.join(changes)}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        kind, _, share = part.partition('=')
+        if kind not in SITE_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown site kind: {kind}")
+        mix[kind] = int(share)
+    return {kind: share for kind, share in mix.items() if share > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EduMonitor sweep benchmark against a local fake-site farm (offline)")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="comma-separated site counts")
+    parser.add_argument('--engines', default=','.join(DEFAULT_ENGINES), help="async and/or sync")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="site kind shares, e.g. fast=90,slow=5,hang=5 (kinds: " + ", ".join(SITE_KINDS) + ")")
+    parser.add_argument('--slow-delay', type=float, default=SLOW_DELAY, help="seconds the 'slow' sites take")
+    parser.add_argument('--output', default='benchmark.json', help="where to write the JSON report")
+    parser.add_argument('--compare', help="previous JSON report to compare against")
+    parser.add_argument('--startup', nargs='?', const=','.join(STARTUP_MODULES), metavar='MODULES',
+                        help="profile the import time of the app entry points (comma-separated) instead of sweeping")
+    args = parser.parse_args()
+
+    if args.startup:
+        report = {'revision': git_revision(), 'timestamp': time.time(), 'python': platform.python_version(),
+                  'platform': platform.platform(), 'startup': run_startup(args.startup.split(',')), 'cases': []}
+        for case in report['startup']:
+            if 'error' in case:
+                print(f"import {case['module']:<12} failed: {case['error']}")
+                continue
+            top = ', '.join(f"{package} {ms:.0f}ms" for package, ms in case['top_packages'].items())
+            print(f"import {case['module']:<12} wall {case['wall_ms']:7.1f}ms  imports {case['import_ms']:7.1f}ms  ({top})")
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Saved {args.output}")
+        if args.compare:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                compare(report, json.load(f))
+        return
+
+    farm, port = start_farm(args.slow_delay)
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'mix': args.mix,
+        'slow_delay': args.slow_delay,
+        'cases': [],
+    }
+    try:
+        for engine in args.engines.split(','):
+            for n in map(int, args.sizes.split(',')):
+                case = run_case(engine, n, port, args.mix)
+                report['cases'].append(case)
+                print(f"{engine:>5} N={n:<6} wall {case['wall_s']:7.2f}s  p50 {case['p50_ms']}ms  p99 {case['p99_ms']}ms  "
+                      f"rss {case['peak_rss_mb']}MB  threads {case['peak_threads']}  fds {case['peak_fds']}  "
+                      f"wrong {case['wrong_verdicts']}")
+    finally:
+        farm.terminate()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Saved {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import argparse
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+
+LOG_FILE = 'check_error.log'
+
+# Rotation: whichever comes first, LOG_MAX_BYTES or LOG_ROTATE_SECONDS. Rotated files
+# are gzipped and the oldest beyond LOG_BACKUPS is deleted.
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_ROTATE_SECONDS = 24 * 3600
+LOG_BACKUPS = 10
+
+# Structured fields copied from a record's `fields` extra into its JSON line
+RECORD_FIELDS = ('event', 'site_id', 'site', 'url', 'latency_ms', 'error_class', 'status_code')
+
+TAIL_BLOCK = 64 * 1024
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: time, level, msg and any structured fields."""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created)),
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update((key, fields[key]) for key in RECORD_FIELDS if fields.get(key) is not None)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RotatingLogHandler(logging.handlers.RotatingFileHandler):
+    """Size- and time-based rotation with gzip compression of rotated files."""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, rotate_seconds=LOG_ROTATE_SECONDS, backups=LOG_BACKUPS):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time.time() + rotate_seconds
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at and os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.rotate_seconds
+
+
+def get_logger(path=LOG_FILE):
+    """Returns the 'edumonitor' logger, starting its background writer on first use.
+
+    Callers only put records on a queue; a single writer thread formats them and
+    owns the file, so logging never blocks a sweep on disk I/O or races other threads.
+    """
+    global _listener
+    logger = logging.getLogger('edumonitor')
+    with _lock:
+        if _listener is None:
+            records = queue.SimpleQueue()
+            handler = RotatingLogHandler(path)
+            handler.setFormatter(JsonLineFormatter())
+            _listener = logging.handlers.QueueListener(records, handler)
+            _listener.start()
+            # Flush what is still queued when the process exits
+            atexit.register(shutdown)
+            logger.addHandler(logging.handlers.QueueHandler(records))
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
+
+
+def shutdown():
+    """Writes out queued records and stops the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _log_files(path, rotated):
+    """The log file and, if rotated, its backups oldest first."""
+    files = []
+    if rotated:
+        backups = [f"{path}.{i}.gz" for i in range(1, LOG_BACKUPS + 1)]
+        files += [backup for backup in reversed(backups) if os.path.exists(backup)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def _parse(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Plain "[time] message" lines written before the log became JSON
+        return {'msg': line}
+
+
+def iter_log(path=LOG_FILE, rotated=False):
+    """Yields every entry, oldest first, reading one line at a time."""
+    for name in _log_files(path, rotated):
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(name, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                entry = _parse(line)
+                if entry is not None:
+                    yield entry
+
+
+def matches(entry, site=None, error_class=None, level=None, since=None, until=None, text=None):
+    if site is not None and site not in (entry.get('site'), str(entry.get('site_id'))):
+        return False
+    if error_class is not None and entry.get('error_class') != error_class:
+        return False
+    if level is not None and entry.get('level') != level.upper():
+        return False
+    ts = entry.get('ts')
+    if since is not None and (ts is None or ts < since):
+        return False
+    if until is not None and (ts is None or ts >= until):
+        return False
+    if text is not None and text not in entry.get('msg', ''):
+        return False
+    return True
+
+
+def query_log(path=LOG_FILE, rotated=False, limit=None, **filters):
+    """Yields entries matching the filters (see matches), oldest first, up to limit."""
+    count = 0
+    for entry in iter_log(path, rotated):
+        if matches(entry, **filters):
+            yield entry
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+
+def tail_log(path=LOG_FILE, n=50, **filters):
+    """Returns the last n matching entries of the current file, reading it backwards in blocks."""
+    found = []
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return found
+    with f:
+        position = f.seek(0, os.SEEK_END)
+        rest = b''
+        while position > 0 and len(found) < n:
+            step = min(TAIL_BLOCK, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + rest).split(b'\n')
+            # The first piece may be a partial line; keep it for the next block
+            rest = lines.pop(0) if position > 0 else b''
+            for line in reversed(lines):
+                entry = _parse(line.decode('utf-8', errors='replace'))
+                if entry is not None and matches(entry, **filters):
+                    found.append(entry)
+                    if len(found) >= n:
+                        break
+    found.reverse()
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tail or filter the EduMonitor check log")
+    parser.add_argument('mode', nargs='?', choices=('tail', 'query'), default='tail')
+    parser.add_argument('-n', type=int, default=50, help="entries to show (tail) or at most (query)")
+    parser.add_argument('--file', default=LOG_FILE)
+    parser.add_argument('--site', help="site name or id")
+    parser.add_argument('--error-class')
+    parser.add_argument('--level')
+    parser.add_argument('--since', type=float, help="epoch seconds")
+    parser.add_argument('--until', type=float, help="epoch seconds")
+    parser.add_argument('--text', help="substring of the message")
+    parser.add_argument('--rotated', action='store_true', help="query: include rotated .gz files")
+    args = parser.parse_args()
+
+    filters = {'site': args.site, 'error_class': args.error_class, 'level': args.level,
+               'since': args.since, 'until': args.until, 'text': args.text}
+    if args.mode == 'tail':
+        entries = tail_log(args.file, args.n, **filters)
+    else:
+        entries = query_log(args.file, args.rotated, args.n, **filters)
+    for entry in entries:
+        print(json.dumps(entry, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import time
+from urllib.parse import urlsplit
+from monitor import WebsiteMonitor, REQUEST_TIMEOUT
+
+URL_FILE = '지역교육청_url.txt'
+
+# Virtual nodes per worker on the hash ring; more replicas give a more even split
+RING_REPLICAS = 160
+
+# A shard that produced nothing for this long is treated as lost
+WORKER_STALL_TIMEOUT = REQUEST_TIMEOUT * 4
+
+DEFAULT_WORKER_PORT = 9100
+# Workers take shards from anyone who connects (there is no authentication), so they only
+# listen locally unless given --listen 0.0.0.0:PORT on a trusted network
+DEFAULT_WORKER_HOST = '127.0.0.1'
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring mapping sites to workers by host.
+
+    All sites of a host land on the same worker, so they share its connection pool
+    and per-host rate limit. Adding or removing a worker only moves the sites of that
+    worker, so the other workers keep their warm connection pools and latency statistics.
+    """
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.nodes = list(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+    def shard(self, urls):
+        """Splits a {name: url} dict into {node: {name: url}}."""
+        shards = {node: {} for node in self.nodes}
+        for name, url in urls.items():
+            shards[self.node_for(urlsplit(url).hostname or name)][name] = url
+        return shards
+
+
+async def _sweep_shard(monitor, urls):
+    """Runs one shard through the monitor's concurrent engine, yielding each result."""
+    monitor.urls = urls
+    async for result in monitor.iter_check_async():
+        yield result
+
+
+def _local_worker(tasks, results):
+    """Worker process: sweeps each shard it receives and reports over the result queue."""
+    monitor = WebsiteMonitor()
+    loop = asyncio.new_event_loop()
+
+    async def sweep(sweep_id, urls):
+        async for result in _sweep_shard(monitor, urls):
+            results.put(('result', sweep_id, result))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        sweep_id, urls = task
+        try:
+            loop.run_until_complete(sweep(sweep_id, urls))
+        except Exception as e:
+            results.put(('error', sweep_id, str(e)))
+        results.put(('done', sweep_id, None))
+    loop.run_until_complete(monitor.aclose())
+    loop.close()
+
+
+class SweepCoordinator:
+    """Shards the URL list across worker processes (or remote worker nodes) and merges results.
+
+    Local mode starts `workers` processes fed through queues. With `nodes`
+    ("host:port" of machines running `python coordinator.py worker`), shards are
+    sent over a newline-delimited JSON socket protocol instead.
+    """
+
+    def __init__(self, workers=None, nodes=None, history=None):
+        self.nodes = list(nodes or [])
+        self.history = history
+        self._monitor = WebsiteMonitor()
+        self._sweep_id = 0
+        self._processes = {}
+        self._tasks = {}
+        self._results = None
+
+        if not self.nodes:
+            workers = workers or os.cpu_count() or 1
+            ctx = multiprocessing.get_context('spawn')
+            self._results = ctx.Queue()
+            for i in range(workers):
+                name = f"worker-{i}"
+                self._tasks[name] = ctx.Queue()
+                process = ctx.Process(target=_local_worker, args=(self._tasks[name], self._results), daemon=True)
+                process.start()
+                self._processes[name] = process
+            self.ring = HashRing(self._processes)
+        else:
+            self.ring = HashRing(self.nodes)
+
+    def close(self):
+        """Stops the local worker processes."""
+        for name, tasks in self._tasks.items():
+            tasks.put(None)
+        for process in self._processes.values():
+            process.join(timeout=5)
+        self._processes.clear()
+
+    def run_check(self, urls, on_result=None):
+        """Sweeps urls across all workers; returns the WebsiteMonitor.run_check result shape.
+
+        on_result, if given, is called with each site's result as it arrives.
+        """
+        # Checked alongside the sweep; only decided once every shard has reported
+        network = self._monitor.start_network_check()
+        shards = self.ring.shard(urls)
+        results = []
+
+        def collect(result):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        if self.nodes:
+            asyncio.run(self._run_remote(shards, collect))
+        else:
+            self._run_local(shards, collect)
+
+        # Sites whose worker died or stalled still need a verdict
+        reported = {r['name'] for r in results}
+        for name, url in urls.items():
+            if name not in reported:
+                collect({'name': name, 'url': url, 'success': False, 'error': "점검 작업자 응답 없음 (Worker lost)",
+                         'error_class': 'worker', 'checked_at': time.time()})
+
+        if self._monitor.is_network_outage(network.result(), results):
+            self._monitor.log_error("Network Error: Cannot connect to internet (reference endpoints and most sites unreachable).",
+                                    event='network_error')
+            return {'network_error': True, 'failed_sites': [], 'results': results}
+
+        if self.history is not None:
+            self.history.record_sweep(results)
+
+        failed_sites = [{'name': r['name'], 'url': r['url'], 'error': r['error']} for r in results if not r['success']]
+        return {'network_error': False, 'failed_sites': failed_sites, 'results': results}
+
+    def _run_local(self, shards, collect):
+        self._sweep_id += 1
+        sweep_id = self._sweep_id
+        pending = set()
+        for name, shard in shards.items():
+            if shard:
+                self._tasks[name].put((sweep_id, shard))
+                pending.add(name)
+
+        # Each worker reports 'done' once; results of earlier, abandoned sweeps are dropped
+        done = 0
+        while done < len(pending):
+            try:
+                kind, result_sweep, payload = self._results.get(timeout=WORKER_STALL_TIMEOUT)
+            except queue.Empty:
+                self._monitor.log_error("Coordinator: worker stalled, giving up on remaining shards")
+                break
+            if result_sweep != sweep_id:
+                continue
+            if kind == 'result':
+                collect(payload)
+            elif kind == 'error':
+                self._monitor.log_error(f"Coordinator: worker failed - {payload}")
+            else:
+                done += 1
+
+    async def _run_remote(self, shards, collect):
+        async def run_node(node, shard):
+            host, port = node.rsplit(':', 1)
+            try:
+                reader, writer = await asyncio.open_connection(host, int(port))
+            except OSError as e:
+                self._monitor.log_error(f"Coordinator: cannot reach worker {node} - {e}")
+                return
+            try:
+                writer.write(json.dumps({'urls': shard}, ensure_ascii=False).encode('utf-8') + b"\n")
+                await writer.drain()
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), timeout=WORKER_STALL_TIMEOUT)
+                    if not line:
+                        break
+                    message = json.loads(line)
+                    if message.get('event') == 'done':
+                        break
+                    collect(message['result'])
+            except (OSError, ValueError, asyncio.TimeoutError) as e:
+                self._monitor.log_error(f"Coordinator: worker {node} failed - {e}")
+            finally:
+                writer.close()
+
+        await asyncio.gather(*(run_node(node, shard) for node, shard in shards.items() if shard))
+
+
+async def serve_worker(host, port):
+    """Remote worker: sweeps each shard sent by a coordinator and streams results back.
+
+    Shards are swept one at a time: the monitor holds a single site list, so a second
+    coordinator connecting mid-sweep waits instead of replacing the first one's sites.
+    """
+    monitor = WebsiteMonitor()
+    sweep_lock = asyncio.Lock()
+
+    async def handle(reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            async with sweep_lock:
+                async for result in _sweep_shard(monitor, request['urls']):
+                    writer.write(json.dumps({'result': result}, ensure_ascii=False).encode('utf-8') + b"\n")
+                    # Wait for a slow coordinator link rather than buffering the whole shard
+                    await writer.drain()
+            writer.write(b'{"event": "done"}\n')
+            await writer.drain()
+        except (OSError, ValueError, KeyError) as e:
+            monitor.log_error(f"Worker: bad request - {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EduMonitor sharded sweep coordinator")
+    parser.add_argument('mode', nargs='?', choices=('sweep', 'worker'), default='sweep')
+    parser.add_argument('--workers', type=int, help="local worker processes (default: CPU count)")
+    parser.add_argument('--nodes', help="comma-separated host:port list of remote workers")
+    parser.add_argument('--listen', default=f"{DEFAULT_WORKER_HOST}:{DEFAULT_WORKER_PORT}",
+                        help="worker mode: address to listen on (use 0.0.0.0:PORT for remote coordinators, trusted networks only)")
+    parser.add_argument('--url-file', default=URL_FILE)
+    args = parser.parse_args()
+
+    if args.mode == 'worker':
+        host, port = args.listen.rsplit(':', 1)
+        asyncio.run(serve_worker(host, int(port)))
+        return
+
+    loader = WebsiteMonitor()
+    loader.load_urls(args.url_file)
+    nodes = args.nodes.split(',') if args.nodes else None
+    coordinator = SweepCoordinator(workers=args.workers, nodes=nodes)
+    try:
+        started = time.time()
+        result = coordinator.run_check(loader.get_urls())
+        print(json.dumps({
+            'network_error': result['network_error'],
+            'failed_sites': result['failed_sites'],
+            'sites': len(result['results']),
+            'seconds': round(time.time() - started, 2),
+        }, ensure_ascii=False, indent=2))
+    finally:
+        coordinator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import random
+import time
+import urllib.request
+from monitor import WebsiteMonitor
+from history import HistoryStore, HISTORY_DB
+from alerts import AlertEngine, ALERT_STATE_FILE
+from snapshot import save_snapshot, load_snapshot, SNAPSHOT_FILE
+import checklog
+
+SETTINGS_FILE = 'settings.json'
+URL_FILE = '지역교육청_url.txt'
+
+# Default probe interval when neither the site list nor settings.json gives one
+DEFAULT_INTERVAL_MINUTES = 10
+# Every site's next probe is moved by up to this share of its interval, and its first one
+# lands anywhere within the first interval, so probes don't all fire at the same moment
+JITTER_RATIO = 0.1
+# Sites falling due within this many seconds of each other are probed in one batch
+BATCH_WINDOW = 1.0
+# Seconds between checks of the site list file for changes (hot reload)
+SITE_RELOAD_INTERVAL = 5
+# Batches come about once a second, so alert states and the snapshot are written at most
+# this often (and at shutdown) rather than after every batch
+STATE_SAVE_INTERVAL = 30
+
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 8765
+# Thin clients give up on the daemon after this long (a forced sweep may take a while),
+# and read its latest results this often
+CLIENT_TIMEOUT = 120
+CLIENT_POLL_SECONDS = 30
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Returns settings.json as a dict, or {} if it is missing or broken."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class ProbeScheduler:
+    """Heap of (due time, site id) deciding which sites to probe next.
+
+    Intervals come from the site's own `interval` column, else from overrides (settings.json
+    "site_intervals", keyed by site name or tag, e.g. {"critical": 30}), else the default.
+    A rescheduled or removed site leaves its old heap entry behind; entries whose due
+    time no longer matches `_due` are skipped when they surface.
+    """
+
+    def __init__(self, default_interval, overrides=None, jitter=JITTER_RATIO):
+        self.default_interval = default_interval
+        self.overrides = dict(overrides or {})
+        self.jitter = jitter
+        self._heap = []
+        self._due = {}
+
+    def interval_for(self, site):
+        if site.interval:
+            return site.interval
+        if site.name in self.overrides:
+            return float(self.overrides[site.name])
+        for tag in site.tags:
+            if tag in self.overrides:
+                return float(self.overrides[tag])
+        return self.default_interval
+
+    def _push(self, site_id, due):
+        self._due[site_id] = due
+        heapq.heappush(self._heap, (due, site_id))
+
+    def sync(self, sites, now):
+        """Schedules new sites (first probe jittered over one interval) and forgets removed ones."""
+        ids = set()
+        for site in sites:
+            ids.add(site.id)
+            if site.id not in self._due:
+                self._push(site.id, now + random.uniform(0, self.interval_for(site)))
+        for site_id in self._due.keys() - ids:
+            del self._due[site_id]
+
+    def reschedule(self, site, now):
+        interval = self.interval_for(site)
+        self._push(site.id, now + interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_due(self):
+        """Due time of the earliest site, or None if nothing is scheduled."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, until):
+        """Removes and returns the ids of every site due by `until`."""
+        ids = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > until:
+                return ids
+            _, site_id = heapq.heappop(self._heap)
+            del self._due[site_id]
+            ids.append(site_id)
+
+
+class MonitorDaemon:
+    """Headless monitor: probes every site on its own schedule and keeps the latest result per site.
+
+    Instead of waking up to poll the clock, the loop sleeps until the earliest site falls
+    due (or the next site list check) and probes everything due then in one batch. The
+    tray, web and Flet apps can read its results over HTTP (see DaemonClient).
+    """
+
+    def __init__(self, monitor, scheduler, alerts=None, snapshot_path=None):
+        self.monitor = monitor
+        self.scheduler = scheduler
+        # Optional alerts.AlertEngine, fed every batch the network was up for
+        self.alerts = alerts
+        # Optional snapshot file: latest results are restored from it at startup (marked
+        # stale until each site's first probe) and rewritten after every batch
+        self.snapshot_path = snapshot_path
+        # site id -> latest probe result
+        self.latest = {}
+        self.network_error = False
+        self.updated_at = None
+        self._probing = None
+        # Results or alert states changed since the last save_state()
+        self._unsaved = False
+
+    async def probe(self, sites):
+        """Probes the given sites now and reschedules them."""
+        async with self._probing:
+            # A batch is often a site or two: a local outage is judged over every site's latest
+            # result, and the caches are written with the rest of the state (save_state)
+            ids = {site.id for site in sites}
+            others = [result for site_id, result in self.latest.items() if site_id not in ids]
+            results = [result async for result in self.monitor.iter_check_async(sites, others, save=False)]
+            now = time.monotonic()
+            for site in sites:
+                self.scheduler.reschedule(site, now)
+            self.network_error = self.monitor.network_error
+            for result in results:
+                self.latest[result['id']] = result
+            self.updated_at = time.time()
+            if self.alerts is not None and not self.network_error:
+                self.alerts.observe_sweep(results)
+            self._unsaved = True
+            return results
+
+    def save_state(self):
+        """Writes the probe caches, and the alert states and snapshot unless the network is down."""
+        self._unsaved = False
+        self.monitor.save_caches()
+        if self.network_error:
+            return
+        states = {}
+        if self.alerts is not None:
+            try:
+                self.alerts.save()
+            except OSError as e:
+                self.monitor.log_error(f"Alert state save failed: {e}")
+            states = {name: site['state'] for name, site in self.alerts.status().items()}
+        if self.snapshot_path is not None:
+            try:
+                save_snapshot(self.status()['results'], states=states, path=self.snapshot_path)
+            except OSError as e:
+                self.monitor.log_error(f"Snapshot save failed: {e}")
+
+    def restore(self):
+        """Fills `latest` from the snapshot file, matching sites by name (ids may have changed)."""
+        snapshot = load_snapshot(self.snapshot_path) if self.snapshot_path is not None else None
+        if snapshot is None:
+            return
+        for result in snapshot['results']:
+            site = self.monitor.sites.by_name(result['name'])
+            if site is not None:
+                result['id'] = site.id
+                self.latest[site.id] = result
+        self.updated_at = snapshot['saved_at']
+
+    async def check_now(self):
+        """Probes every site immediately (the 'Check Now' button of a thin client)."""
+        await self.probe(list(self.monitor.sites))
+        return self.status()
+
+    def _sync_sites(self):
+        sites = list(self.monitor.sites)
+        self.scheduler.sync(sites, time.monotonic())
+        ids = {site.id for site in sites}
+        self.latest = {site_id: result for site_id, result in self.latest.items() if site_id in ids}
+        if self.alerts is not None:
+            self.alerts.retain(site.name for site in sites)
+
+    async def run(self):
+        self._probing = asyncio.Lock()
+        self.restore()
+        self._sync_sites()
+        await self.monitor.prewarm_dns_async()
+        dns_refresh = asyncio.ensure_future(self.monitor.dns_cache.refresh_forever(self.monitor.get_hosts))
+        next_reload = time.monotonic() + SITE_RELOAD_INTERVAL
+        next_save = time.monotonic() + STATE_SAVE_INTERVAL
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_reload:
+                    if await asyncio.to_thread(self.monitor.reload_urls):
+                        self._sync_sites()
+                        await self.monitor.prewarm_dns_async()
+                    next_reload = now + SITE_RELOAD_INTERVAL
+                if now >= next_save:
+                    if self._unsaved:
+                        await asyncio.to_thread(self.save_state)
+                    next_save = now + STATE_SAVE_INTERVAL
+
+                due = self.scheduler.next_due()
+                wake_at = min(next_reload, next_save) if due is None else min(due, next_reload, next_save)
+                if wake_at > now:
+                    await asyncio.sleep(wake_at - now)
+                    continue
+
+                ids = self.scheduler.pop_due(now + BATCH_WINDOW)
+                sites = [site for site in map(self.monitor.sites.get, ids) if site is not None]
+                if sites:
+                    try:
+                        await self.probe(sites)
+                    except Exception as e:
+                        self.monitor.log_error(f"Scheduled probe failed: {e}")
+                        for site in sites:
+                            self.scheduler.reschedule(site, time.monotonic())
+        finally:
+            dns_refresh.cancel()
+            if self._unsaved:
+                self.save_state()
+
+    def status(self):
+        """Latest result of every site in site-list order, plus alert states."""
+        results = [self.latest[site.id] for site in self.monitor.sites if site.id in self.latest]
+        status = {
+            'network_error': self.network_error,
+            'updated_at': self.updated_at,
+            'results': results,
+            'failed': sum(1 for r in results if not r['success']),
+        }
+        if self.alerts is not None:
+            status['states'] = self.alerts.status()
+            status['alerts'] = list(self.alerts.recent)
+        return status
+
+
+def make_app(daemon):
+    """aiohttp app serving the daemon's results to thin clients."""
+    # Imported here: thin clients (tray, Flet) import this module only for DaemonClient
+    from aiohttp import web
+
+    async def get_status(request):
+        return web.json_response(daemon.status(), dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    async def post_check(request):
+        return web.json_response(await daemon.check_now(), dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    app = web.Application()
+    app.add_routes([web.get('/api/status', get_status), web.post('/api/check', post_check)])
+    return app
+
+
+class DaemonClient:
+    """Synchronous client for a running daemon; returns WebsiteMonitor.run_check shaped results.
+
+    The extra 'states' and 'alerts' keys carry the daemon's alert engine, so a client
+    notifies from those instead of running its own.
+    """
+
+    def __init__(self, url, timeout=CLIENT_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, method='GET'):
+        request = urllib.request.Request(self.url + path, method=method)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            status = json.load(response)
+        results = status['results']
+        status['failed_sites'] = [] if status['network_error'] else [
+            {'name': r['name'], 'url': r['url'], 'error': r['error'], 'probe': r} for r in results if not r['success']]
+        return status
+
+    def status(self):
+        """Latest results, as of the daemon's last probes."""
+        return self._request('/api/status')
+
+    def check(self):
+        """Makes the daemon probe every site now and returns the results."""
+        return self._request('/api/check', method='POST')
+
+
+def daemon_client(settings=None):
+    """Returns a DaemonClient if settings.json (or EDUMONITOR_DAEMON_URL) names a daemon, else None."""
+    url = os.environ.get('EDUMONITOR_DAEMON_URL') or (settings or load_settings()).get('daemon_url')
+    return DaemonClient(url) if url else None
+
+
+async def serve(daemon, host, port):
+    from aiohttp import web
+    runner = None
+    if port:
+        runner = web.AppRunner(make_app(daemon), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+    try:
+        await daemon.run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await daemon.monitor.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless EduMonitor daemon: probes sites on their own schedules")
+    parser.add_argument('--urls', default=URL_FILE, help="site list file")
+    parser.add_argument('--settings', default=SETTINGS_FILE)
+    parser.add_argument('--host', default=DAEMON_HOST)
+    parser.add_argument('--port', type=int, default=None, help=f"HTTP port for thin clients (0 disables; default {DAEMON_PORT})")
+    args = parser.parse_args()
+
+    settings = load_settings(args.settings)
+    port = args.port if args.port is not None else settings.get('daemon_port', DAEMON_PORT)
+    history = HistoryStore(os.environ.get('HISTORY_DB', HISTORY_DB))
+    monitor = WebsiteMonitor(history=history, network_endpoints=settings.get('network_endpoints'))
+    monitor.load_urls(args.urls)
+    scheduler = ProbeScheduler(settings.get('interval_minutes', DEFAULT_INTERVAL_MINUTES) * 60,
+                               settings.get('site_intervals'))
+    daemon = MonitorDaemon(monitor, scheduler, AlertEngine(os.environ.get('ALERT_STATE_FILE', ALERT_STATE_FILE)),
+                           os.environ.get('SNAPSHOT_FILE', SNAPSHOT_FILE))
+    try:
+        asyncio.run(serve(daemon, args.host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        history.close()
+        checklog.shutdown()
+
+
+if __name__ == "__main__":
+    main()
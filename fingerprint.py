@@ -0,0 +1,218 @@
+import codecs
+import collections
+import hashlib
+import json
+import re
+import threading
+import time
+from atomicfile import atomic_write_json
+
+# Bytes of body read at most per content probe; the rest of a huge page is not fingerprinted
+CONTENT_MAX_BYTES = 2 * 1024 * 1024
+CONTENT_CHUNK_BYTES = 64 * 1024
+# Without a charset in the Content-Type header, the page's own <meta charset> is looked
+# for in this much of its start (the first network chunk may be much shorter)
+CHARSET_SNIFF_BYTES = 4096
+
+# Simhash bits that may differ from the baseline before the page counts as changed (of 64)
+CONTENT_CHANGE_BITS = 12
+
+CONTENT_BASELINES_FILE = 'content_baselines.json'
+
+# Blocks whose content is not visible text, and any other markup
+_SKIP_OPEN = re.compile(r'<(script|style|noscript)\b[^>]*>', re.I)
+_SKIP_CLOSE = {name: re.compile(rf'</{name}\s*>', re.I) for name in ('script', 'style', 'noscript')}
+_MARKUP = re.compile(r'<!--.*?-->|<[^>]*>', re.S)
+_WORD = re.compile(r'\w+')
+_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+# Text after the last complete tag is held back until the next chunk, but not beyond this
+_CARRY_LIMIT = 64 * 1024
+
+
+# Simhash bit sums are kept as 64 lanes of one big integer: _SPREAD[k][v] has a 1 in lane
+# 8k+j for every set bit j of byte value v, so adding a feature costs 8 lookups instead of 64 steps
+_LANE_BITS = 32
+_LANE_MASK = (1 << _LANE_BITS) - 1
+_SPREAD = [
+    [sum(1 << (_LANE_BITS * (8 * k + j)) for j in range(8) if v >> j & 1) for v in range(256)]
+    for k in range(8)
+]
+
+
+def _feature_hash(token):
+    return hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class PageFingerprint:
+    """Incremental fingerprint of a page's visible text, fed raw body chunks.
+
+    Markup, scripts and styles are dropped and text is lower-cased and split into
+    words; pure numbers (dates, hit counters, session ids) are ignored, so routine
+    churn doesn't look like a change. Only counters are kept: a 64-bit simhash of the
+    word counts, a digest of the word stream and the required keywords seen so far.
+    """
+
+    def __init__(self, keywords=(), charset=None):
+        self.keywords = tuple(keyword.lower() for keyword in keywords)
+        self.found = set()
+        self.size = 0
+        self.words = 0
+        self._charset = charset
+        self._decoder = None
+        self._head = b''
+        self._carry = ''
+        self._skip = None
+        self._counts = collections.Counter()
+        self._digest = hashlib.blake2b(digest_size=16)
+        self._keyword_tail = ''
+        self._keyword_overlap = max((len(keyword) for keyword in self.keywords), default=1) - 1
+
+    def _make_decoder(self, first_chunk):
+        charset = self._charset
+        if charset is None:
+            match = _CHARSET.search(first_chunk[:CHARSET_SNIFF_BYTES])
+            charset = match.group(1).decode('ascii') if match else 'utf-8'
+        try:
+            return codecs.getincrementaldecoder(charset)(errors='replace')
+        except LookupError:
+            return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def feed(self, chunk, final=False):
+        self.size += len(chunk)
+        if self._decoder is None:
+            self._head += chunk
+            if self._charset is None and len(self._head) < CHARSET_SNIFF_BYTES and not final:
+                return
+            self._decoder = self._make_decoder(self._head)
+            chunk, self._head = self._head, b''
+        text = self._carry + self._decoder.decode(chunk, final)
+        if final:
+            end = len(text)
+        else:
+            # Only complete markup is parsed now; a trailing partial tag or word waits for more
+            end = text.rfind('>') + 1
+            if len(text) - end > _CARRY_LIMIT:
+                end = len(text)
+        self._carry = text[end:]
+        self._parse(text[:end])
+
+    def close(self):
+        self.feed(b'', final=True)
+
+    def _parse(self, html):
+        visible = []
+        position = 0
+        while position < len(html):
+            if self._skip is not None:
+                match = _SKIP_CLOSE[self._skip].search(html, position)
+                if match is None:
+                    break
+                self._skip = None
+                position = match.end()
+            match = _SKIP_OPEN.search(html, position)
+            if match is None:
+                visible.append(html[position:])
+                break
+            visible.append(html[position:match.start()])
+            self._skip = match.group(1).lower()
+            position = match.end()
+        self._text(_MARKUP.sub(' ', ' '.join(visible)))
+
+    def _text(self, text):
+        words = [word for word in _WORD.findall(text.lower()) if not word.isdigit()]
+        if not words:
+            return
+        joined = ' '.join(words)
+        self.words += len(words)
+        self._digest.update(joined.encode('utf-8') + b' ')
+        self._counts.update(words)
+        if self.keywords:
+            window = self._keyword_tail + ' ' + joined
+            self.found.update(keyword for keyword in self.keywords if keyword in window)
+            self._keyword_tail = window[-self._keyword_overlap:] if self._keyword_overlap else ''
+
+    def simhash(self):
+        """64-bit simhash over distinct words, weighted by count."""
+        spread = _SPREAD
+        lanes = 0
+        total = 0
+        for word, count in self._counts.items():
+            h = _feature_hash(word)
+            lanes += count * (spread[0][h[7]] | spread[1][h[6]] | spread[2][h[5]] | spread[3][h[4]]
+                              | spread[4][h[3]] | spread[5][h[2]] | spread[6][h[1]] | spread[7][h[0]])
+            total += count
+        # A bit is set when the words having it outweigh those that don't
+        return sum(1 << bit for bit in range(64) if (lanes >> (_LANE_BITS * bit) & _LANE_MASK) * 2 > total)
+
+    def digest(self):
+        return self._digest.hexdigest()
+
+    def missing_keywords(self):
+        return [keyword for keyword in self.keywords if keyword not in self.found]
+
+
+class ContentBaselines:
+    """Per-URL page fingerprints, kept in a small JSON file.
+
+    A page that is close to its baseline (within CONTENT_CHANGE_BITS) becomes the new
+    baseline, so gradual edits such as a news list don't add up to an alarm. A large
+    change is reported and the old baseline is kept until accept() (e.g. after a redesign).
+    Each process keeps its own baselines: apps sharing the file overwrite each other's
+    saves (last writer wins), which at worst sets a page's baseline again.
+    """
+
+    def __init__(self, path=CONTENT_BASELINES_FILE, change_bits=CONTENT_CHANGE_BITS):
+        self.path = path
+        self.change_bits = change_bits
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._baselines = json.load(f)
+        except (OSError, ValueError):
+            self._baselines = {}
+
+    def compare(self, url, fingerprint):
+        """Checks a finished fingerprint against the URL's baseline; returns the result's 'content' dict."""
+        simhash = fingerprint.simhash()
+        digest = fingerprint.digest()
+        entry = {'simhash': simhash, 'digest': digest, 'words': fingerprint.words, 'updated': time.time()}
+        with self._lock:
+            baseline = self._baselines.get(url)
+            distance = None if baseline is None else hamming(simhash, baseline['simhash'])
+            changed = distance is not None and distance > self.change_bits
+            if not changed and (baseline is None or baseline['digest'] != digest):
+                self._baselines[url] = entry
+                self._dirty = True
+        return {
+            'distance': distance,
+            'changed': changed,
+            'identical': baseline is not None and baseline['digest'] == digest,
+            'missing_keywords': fingerprint.missing_keywords(),
+            'words': fingerprint.words,
+        }
+
+    def accept(self, url):
+        """Forgets the URL's baseline; its next content probe sets a new one."""
+        with self._lock:
+            if self._baselines.pop(url, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """Writes the baselines if they changed (see atomic_write_json). Raises OSError if they can't be written."""
+        with self._lock:
+            if not self._dirty:
+                return
+            # Entries are replaced, never modified, so a shallow copy is a consistent snapshot
+            data = dict(self._baselines)
+            self._dirty = False
+        try:
+            atomic_write_json(self.path, data)
+        except OSError:
+            # Written again at the next save
+            self._dirty = True
+            raise
@@ -0,0 +1,287 @@
+import math
+import sqlite3
+import threading
+import time
+
+HISTORY_DB = 'check_history.db'
+
+# Windows up to RAW_QUERY_LIMIT are answered from raw probes (latency only for a single site), up to HOURLY_QUERY_LIMIT
+# from hourly rollups, and anything longer from daily rollups.
+RAW_QUERY_LIMIT = 2 * 24 * 3600
+HOURLY_QUERY_LIMIT = 31 * 24 * 3600
+
+# Raw probes older than this are dropped (rollups and outages are kept); checked at most
+# once per PRUNE_INTERVAL seconds, after a sweep is written
+RAW_RETENTION_DAYS = 90
+PRUNE_INTERVAL = 24 * 3600
+
+# Rollup tables (name suffix, period in seconds), maintained on every write
+ROLLUPS = (('hourly', 3600), ('daily', 86400))
+
+# Latency histogram buckets grow by 25% each (bucket b covers up to LATENCY_BASE ** b ms),
+# so rollups give p50/p95 within ~12% without keeping every sample.
+LATENCY_BASE = 1.25
+LATENCY_BUCKETS = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS probes (
+    site_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,            -- epoch milliseconds
+    ok INTEGER NOT NULL,
+    status_code INTEGER,
+    latency_ms REAL,
+    error_class TEXT,
+    PRIMARY KEY (site_id, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS outages (
+    site_id INTEGER NOT NULL,
+    start_ts INTEGER NOT NULL,      -- epoch milliseconds of the first failed probe
+    end_ts INTEGER,                 -- first successful probe afterwards; NULL while ongoing
+    error_class TEXT,
+    PRIMARY KEY (site_id, start_ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS outages_open ON outages (site_id) WHERE end_ts IS NULL;
+-- Covering index for all-sites queries over a time window
+CREATE INDEX IF NOT EXISTS probes_by_time ON probes (ts, site_id, ok);
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_{name} (
+    site_id INTEGER NOT NULL,
+    period INTEGER NOT NULL,        -- epoch seconds, truncated to the rollup period
+    total INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    PRIMARY KEY (site_id, period)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollup_{name}_by_period ON rollup_{name} (period, site_id, total, ok);
+CREATE TABLE IF NOT EXISTS latency_{name} (
+    site_id INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (site_id, period, bucket)
+) WITHOUT ROWID;
+"""
+
+
+def latency_bucket(latency_ms):
+    """Returns the histogram bucket for a latency."""
+    if latency_ms <= 1:
+        return 0
+    return min(LATENCY_BUCKETS - 1, math.ceil(math.log(latency_ms, LATENCY_BASE)))
+
+
+def bucket_upper_ms(bucket):
+    """Returns the upper latency bound of a histogram bucket."""
+    return LATENCY_BASE ** bucket
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def histogram_percentile(counts, q):
+    """Percentile from {bucket: count}, reported as the bucket's upper bound."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    rank = math.ceil(q / 100 * total)
+    seen = 0
+    for bucket in sorted(counts):
+        seen += counts[bucket]
+        if seen >= rank:
+            return bucket_upper_ms(bucket)
+    return bucket_upper_ms(max(counts))
+
+
+class HistoryStore:
+    """SQLite-backed probe history with hourly rollups and outage intervals.
+
+    Raw probes are keyed by (site_id, ts) so per-site window scans use the primary key.
+    Hourly/daily rollups and outage intervals are maintained at write time, so uptime
+    and latency over months, and outage lists, never need a scan of the raw table.
+    Rollup answers are aligned to whole periods at the window edges.
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        for name, _ in ROLLUPS:
+            self._conn.executescript(ROLLUP_SCHEMA.format(name=name))
+        self._site_ids = dict(self._conn.execute("SELECT name, id FROM sites"))
+        # Sites currently inside an outage: site_id -> start_ts
+        self._open_outages = dict(self._conn.execute("SELECT site_id, start_ts FROM outages WHERE end_ts IS NULL"))
+        self._last_prune = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _site_id(self, name, url):
+        site_id = self._site_ids.get(name)
+        if site_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO sites (name, url) VALUES (?, ?)", (name, url))
+            site_id = self._conn.execute("SELECT id FROM sites WHERE name = ?", (name,)).fetchone()[0]
+            self._site_ids[name] = site_id
+        return site_id
+
+    def record_sweep(self, results):
+        """Writes one sweep's results (dicts from WebsiteMonitor.iter_check_async) in a single transaction."""
+        if not results:
+            return
+        probes = []
+        rollups = {}
+        latencies = {}
+        opened = []
+        closed = []
+
+        with self._lock, self._conn:
+            for r in results:
+                site_id = self._site_id(r['name'], r['url'])
+                ts = int(r['checked_at'] * 1000)
+                ok = 1 if r['success'] else 0
+                probes.append((site_id, ts, ok, r.get('status_code'), r.get('latency_ms'), r.get('error_class')))
+
+                for name, seconds in ROLLUPS:
+                    period = int(r['checked_at']) // seconds * seconds
+                    key = (name, site_id, period)
+                    total, ok_count = rollups.get(key, (0, 0))
+                    rollups[key] = (total + 1, ok_count + ok)
+                    if ok and r.get('latency_ms') is not None:
+                        key = (name, site_id, period, latency_bucket(r['latency_ms']))
+                        latencies[key] = latencies.get(key, 0) + 1
+
+                # Outage intervals open on the first failure and close on the next success
+                if not ok and site_id not in self._open_outages:
+                    self._open_outages[site_id] = ts
+                    opened.append((site_id, ts, r.get('error_class')))
+                elif ok and site_id in self._open_outages:
+                    closed.append((ts, site_id, self._open_outages.pop(site_id)))
+
+            self._conn.executemany("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)", probes)
+            for name, _ in ROLLUPS:
+                self._conn.executemany(
+                    f"INSERT INTO rollup_{name} VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (site_id, period) DO UPDATE SET total = total + excluded.total, ok = ok + excluded.ok",
+                    [(site_id, period, total, ok) for (n, site_id, period), (total, ok) in rollups.items() if n == name],
+                )
+                self._conn.executemany(
+                    f"INSERT INTO latency_{name} VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (site_id, period, bucket) DO UPDATE SET count = count + excluded.count",
+                    [key[1:] + (count,) for key, count in latencies.items() if key[0] == name],
+                )
+            self._conn.executemany("INSERT OR IGNORE INTO outages (site_id, start_ts, error_class) VALUES (?, ?, ?)", opened)
+            self._conn.executemany("UPDATE outages SET end_ts = ? WHERE site_id = ? AND start_ts = ?", closed)
+
+        now = time.monotonic()
+        if self._last_prune is None or now - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = now
+            self.prune()
+
+    def _rollup_for(self, start, end):
+        """Returns (table name suffix, period) of the rollup to answer a window from."""
+        if end - start <= HOURLY_QUERY_LIMIT:
+            return ROLLUPS[0]
+        return ROLLUPS[1]
+
+    def _site_filter(self, site):
+        """Returns {site_id: name} for one site name, or for every known site."""
+        # record_sweep adds sites from a worker thread
+        with self._lock:
+            if site is None:
+                return {site_id: name for name, site_id in self._site_ids.items()}
+            site_id = self._site_ids.get(site)
+        return {} if site_id is None else {site_id: site}
+
+    def uptime(self, start, end, site=None):
+        """Uptime percentage per site between start and end (epoch seconds)."""
+        sites = self._site_filter(site)
+        with self._lock:
+            if end - start <= RAW_QUERY_LIMIT:
+                rows = self._conn.execute(
+                    "SELECT site_id, COUNT(*), SUM(ok) FROM probes WHERE ts >= ? AND ts < ? GROUP BY site_id",
+                    (int(start * 1000), int(end * 1000)),
+                ).fetchall()
+            else:
+                name, seconds = self._rollup_for(start, end)
+                rows = self._conn.execute(
+                    f"SELECT site_id, SUM(total), SUM(ok) FROM rollup_{name} WHERE period >= ? AND period < ? GROUP BY site_id",
+                    (int(start) // seconds * seconds, int(end)),
+                ).fetchall()
+        return {
+            sites[site_id]: {'probes': total, 'uptime': round(ok * 100.0 / total, 3)}
+            for site_id, total, ok in rows if site_id in sites and total
+        }
+
+    def latency(self, start, end, site=None):
+        """p50/p95 latency (ms) of successful probes per site between start and end.
+
+        Exact percentiles from the raw probes need one query per site, so they are only
+        used for a single site; all-site windows are answered from the hourly histograms.
+        """
+        sites = self._site_filter(site)
+        stats = {}
+        with self._lock:
+            if site is not None and end - start <= RAW_QUERY_LIMIT:
+                for site_id in sites:
+                    values = [row[0] for row in self._conn.execute(
+                        "SELECT latency_ms FROM probes WHERE site_id = ? AND ts >= ? AND ts < ? AND ok = 1 "
+                        "AND latency_ms IS NOT NULL ORDER BY latency_ms",
+                        (site_id, int(start * 1000), int(end * 1000)),
+                    )]
+                    if values:
+                        stats[sites[site_id]] = {'samples': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+            else:
+                name, seconds = self._rollup_for(start, end)
+                counts = {}
+                for site_id, bucket, count in self._conn.execute(
+                    f"SELECT site_id, bucket, SUM(count) FROM latency_{name} WHERE period >= ? AND period < ? GROUP BY site_id, bucket",
+                    (int(start) // seconds * seconds, int(end)),
+                ):
+                    counts.setdefault(site_id, {})[bucket] = count
+                for site_id, buckets in counts.items():
+                    if site_id in sites:
+                        stats[sites[site_id]] = {
+                            'samples': sum(buckets.values()),
+                            'p50': histogram_percentile(buckets, 50),
+                            'p95': histogram_percentile(buckets, 95),
+                        }
+        return stats
+
+    def outages(self, start, end, site=None):
+        """Outage intervals overlapping [start, end) per site, in epoch seconds (end None = ongoing)."""
+        sites = self._site_filter(site)
+        result = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT site_id, start_ts, end_ts, error_class FROM outages "
+                "WHERE start_ts < ? AND (end_ts IS NULL OR end_ts > ?) ORDER BY site_id, start_ts",
+                (int(end * 1000), int(start * 1000)),
+            ).fetchall()
+        for site_id, start_ts, end_ts, error_class in rows:
+            if site_id in sites:
+                result.setdefault(sites[site_id], []).append({
+                    'start': start_ts / 1000,
+                    'end': None if end_ts is None else end_ts / 1000,
+                    'error_class': error_class,
+                })
+        return result
+
+    def prune(self, older_than_days=RAW_RETENTION_DAYS):
+        """Drops raw probes older than the given age; rollups and outages are kept."""
+        cutoff = int((time.time() - older_than_days * 86400) * 1000)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM probes WHERE ts < ?", (cutoff,))
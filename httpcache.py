@@ -0,0 +1,82 @@
+import collections
+import json
+import threading
+from atomicfile import atomic_write_json
+
+VALIDATOR_CACHE_FILE = 'http_validators.json'
+# URLs whose validators are kept; the least recently probed are dropped beyond this
+VALIDATOR_CACHE_SIZE = 10000
+
+
+class ValidatorCache:
+    """Per-URL ETag / Last-Modified values, for conditional probe requests.
+
+    A page that hasn't changed since the last probe comes back as a bodyless 304, which
+    still proves the server and application answered. Bounded as an LRU and kept in a
+    small JSON file (least recently used first), so a restart doesn't re-download everything.
+    Each process keeps its own copy: apps sharing the file overwrite each other's saves,
+    which at worst costs one full download of a page.
+    """
+
+    def __init__(self, path=VALIDATOR_CACHE_FILE, size=VALIDATOR_CACHE_SIZE):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = []
+        self._validators = collections.OrderedDict(
+            (entry[0], (entry[1], entry[2])) for entry in entries[-size:] if len(entry) == 3)
+
+    def __len__(self):
+        return len(self._validators)
+
+    def headers_for(self, url):
+        """Returns the If-None-Match / If-Modified-Since headers for a URL, or None if nothing is cached."""
+        with self._lock:
+            validators = self._validators.get(url)
+        if validators is None:
+            return None
+        etag, last_modified = validators
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def update(self, url, status, headers):
+        """Records the validators of a successful response (a 304 only marks the URL as recently used)."""
+        with self._lock:
+            if status == 304:
+                if url in self._validators:
+                    self._validators.move_to_end(url)
+                return
+            validators = (headers.get('ETag'), headers.get('Last-Modified'))
+            if validators == (None, None):
+                if self._validators.pop(url, None) is not None:
+                    self._dirty = True
+                return
+            if self._validators.get(url) != validators:
+                self._dirty = True
+            self._validators[url] = validators
+            self._validators.move_to_end(url)
+            if len(self._validators) > self.size:
+                self._validators.popitem(last=False)
+
+    def save(self):
+        """Writes the cache if it changed (see atomic_write_json). Raises OSError if it can't be written."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = [[url, *validators] for url, validators in self._validators.items()]
+            self._dirty = False
+        try:
+            atomic_write_json(self.path, data)
+        except OSError:
+            # Written again at the next save
+            self._dirty = True
+            raise
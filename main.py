@@ -2,76 +2,537 @@
 from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 import uvicorn
 import os
+import json
+import time
+import asyncio
 from monitor import WebsiteMonitor
+from history import HistoryStore, HISTORY_DB
+from metrics import ProbeMetrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from alerts import AlertEngine, ALERT_STATE_FILE, DOWN, RECOVERING
+from daemon import daemon_client, CLIENT_POLL_SECONDS
+from snapshot import save_snapshot, load_snapshot, SNAPSHOT_FILE
+from batch import BatchQueue, parse_batch
 
 app = FastAPI(title="EduMonitor Web")
 
 # Templates
 templates = Jinja2Templates(directory="templates")
 
-# Monitor
-monitor = WebsiteMonitor()
+SETTINGS_FILE = 'settings.json'
+
+def load_settings():
+    """Returns settings.json (shared with the tray app) as a dict, or {} if missing or broken."""
+    try:
+        with open(SETTINGS_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Monitor (every sweep is also recorded in the probe history store)
+history = HistoryStore(os.environ.get('HISTORY_DB', HISTORY_DB))
+monitor = WebsiteMonitor(history=history, network_endpoints=load_settings().get('network_endpoints'))
+# Prometheus metrics, fed by every sweep and served from memory at /metrics
+metrics = ProbeMetrics()
+# Per-site alert states (UP/SUSPECT/DOWN/RECOVERING); same engine and state file as the tray app
+alerts = AlertEngine(os.environ.get('ALERT_STATE_FILE', ALERT_STATE_FILE))
+# With a headless daemon configured (EDUMONITOR_DAEMON_URL or "daemon_url" in settings.json),
+# sweeps read its results instead of probing from this process
+daemon = daemon_client(load_settings())
 # Load URLs (Ensure the file exists in the same directory or provide full path)
-URL_FILE = '지역교육청_url.txt'
+URL_FILE = os.environ.get('URL_FILE', '지역교육청_url.txt')
 monitor.load_urls(URL_FILE)
+# Seconds between checks of the site list file for changes (hot reload)
+SITE_RELOAD_INTERVAL = 5
 
 # API Models
 class CheckResponse(BaseModel):
     network_error: bool
     results: list[dict]
+    checked_at: float
+    age: float
+    sweep_id: int
+    full: bool
 
 @app.get("/")
 async def read_root(request: Request):
-    urls = monitor.get_urls()
-    return templates.TemplateResponse("index.html", {"request": request, "urls": urls})
+    return templates.TemplateResponse("index.html", {"request": request, "sites": list(monitor.sites)})
 
-@app.get("/api/check")
-async def check_websites():
-    # Note: monitor.run_check is synchronous (uses requests/socket)
-    # FastAPI runs sync path operations in a threadpool, so this is safe and won't block the loop.
-    result = monitor.run_check()
-    
-    # Transform result for frontend easy consumption
-    # result structure from monitor.py: {'network_error': bool, 'failed_sites': [{'name', 'url', 'error'}]}
-    # We want to return status for ALL sites, not just failed ones.
-    
-    all_results = []
-    urls = monitor.get_urls()
-    
-    if result['network_error']:
-        # If network error, mark all as failed (or unknown)
-        for name, url in urls.items():
-             all_results.append({
-                "name": name, 
-                "url": url, 
-                "status": "error", 
-                "msg": "Network Error"
-            })
+# Probe result fields passed through to the frontend (see WebsiteMonitor.probe_async)
+PROBE_FIELDS = ('status_code', 'latency_ms', 'timings', 'size', 'retries', 'error_class', 'content')
+
+def site_result(name, url, success, error, probe=None):
+    """Builds the per-site entry sent to the frontend."""
+    if success:
+        entry = {"name": name, "url": url, "status": "ok", "msg": "OK"}
     else:
-        # Map failures for quick lookup
-        failed_map = {item['name']: item['error'] for item in result['failed_sites']}
-        
-        for name, url in urls.items():
-            if name in failed_map:
-                all_results.append({
-                    "name": name, 
-                    "url": url, 
-                    "status": "error", 
-                    "msg": failed_map[name]
-                })
+        entry = {"name": name, "url": url, "status": "error", "msg": error}
+    if probe is not None:
+        entry.update({field: probe.get(field) for field in PROBE_FIELDS})
+    return entry
+
+# Fields compared between sweeps to decide whether a site changed; latency alone doesn't
+# count, or every site would "change" on every sweep and ?since= deltas would be useless.
+CHANGE_FIELDS = ('status', 'msg', 'status_code', 'error_class')
+
+def sse_event(event, data):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def load_check_interval():
+    """Returns the sweep interval in seconds (CHECK_INTERVAL_SECONDS, else settings.json)."""
+    if os.environ.get('CHECK_INTERVAL_SECONDS'):
+        return int(os.environ['CHECK_INTERVAL_SECONDS'])
+    try:
+        return int(load_settings().get('interval_minutes', 1) * 60)
+    except (TypeError, ValueError):
+        return 60
+
+class Sweep:
+    """One in-flight sweep whose results are shared by every viewer waiting on it."""
+
+    def __init__(self, fresh=False):
+        self.fresh = fresh
+        self.results = []
+        self.snapshot = None
+        self.done = False
+        self.changed = asyncio.Condition()
+        self.task = None
+
+class SweepCache:
+    """Runs at most one sweep at a time and serves its latest snapshot to all viewers.
+
+    Concurrent requests join the in-flight sweep (single-flight) instead of starting
+    their own, so the number of open dashboards doesn't multiply outbound probes.
+    """
+
+    def __init__(self, monitor, ttl, metrics=None, alerts=None, daemon=None, snapshot_path=None):
+        self.monitor = monitor
+        self.ttl = ttl
+        # Optional snapshot file: written after every sweep, read back by restore() at startup
+        self.snapshot_path = snapshot_path
+        # Optional daemon.DaemonClient; when set, sweeps read the daemon's latest results
+        self.daemon = daemon
+        # Optional metrics.ProbeMetrics; every finished sweep is recorded in it
+        self.metrics = metrics
+        # Optional alerts.AlertEngine; fed every sweep the network was up for
+        self.alerts = alerts
+        self.snapshot = None
+        self.sweep_id = 0
+        self._sweep = None
+        # Per-site change tracking for ?since= deltas: name -> last CHANGE_FIELDS values,
+        # and name -> id of the sweep in which they last changed
+        self._signatures = {}
+        self._changed_in = {}
+        # Sweeps before this id saw a different site list, so they can't be diffed against
+        self._base_id = 0
+        # Daemon mode: site name -> checked_at of its last result already fed to metrics
+        self._daemon_checked = {}
+
+    def age(self):
+        """Seconds since the cached snapshot was taken, or None if there is none."""
+        if self.snapshot is None:
+            return None
+        return time.time() - self.snapshot['checked_at']
+
+    def restore(self):
+        """Loads the last saved sweep as the current (stale) snapshot, so viewers see the
+        last known status right away instead of a blank dashboard until the first sweep ends."""
+        saved = load_snapshot(self.snapshot_path)
+        if saved is None:
+            return False
+        results = []
+        for probe in saved['results']:
+            # Site ids may have changed with the site list since the snapshot was taken
+            site = self.monitor.sites.by_name(probe['name'])
+            if site is not None:
+                entry = site_result(site.name, site.url, probe['success'], probe['error'], probe)
+                results.append({"id": site.id, **entry})
+        self.snapshot = {
+            "sweep_id": self.sweep_id,
+            "network_error": saved['network_error'],
+            "results": results,
+            "failed": sum(1 for r in results if r['status'] != 'ok'),
+            "alerts": [],
+            "checked_at": saved['saved_at'],
+            "restored": True,
+        }
+        return True
+
+    def is_fresh(self):
+        # A restored snapshot is never fresh: it only stands in until this process's first sweep
+        age = self.age()
+        return age is not None and age < self.ttl and not self.snapshot.get('restored')
+
+    def start(self, fresh=False):
+        """Returns the in-flight sweep, starting a new one if none is running."""
+        if self._sweep is None or self._sweep.done:
+            self._sweep = Sweep(fresh)
+            self._sweep.task = asyncio.ensure_future(self._run(self._sweep))
+        return self._sweep
+
+    async def _publish(self, sweep, result):
+        async with sweep.changed:
+            sweep.results.append(result)
+            sweep.changed.notify_all()
+
+    async def _run(self, sweep):
+        sites = list(self.monitor.sites)
+        started = time.monotonic()
+        probes = []
+        # Ids of the sites the daemon probed since the last poll (None: this process probed them all)
+        fresh = None if self.daemon is None else set()
+        try:
+            if self.daemon is not None:
+                # Thin client: the daemon probes on its own schedule, ?fresh=1 asks it to probe now
+                try:
+                    status = await asyncio.to_thread(self.daemon.check if sweep.fresh else self.daemon.status)
+                except (OSError, ValueError) as e:
+                    # Keep serving the last known results; the next request asks the daemon again
+                    self.monitor.log_error(f"Daemon unreachable ({self.daemon.url}): {e}")
+                    sweep.snapshot = self._daemon_error_snapshot(str(e))
+                    return
+                for result in status['results']:
+                    # The daemon numbers its own site list: match sites by name, as restore() does
+                    site = self.monitor.sites.by_name(result['name'])
+                    if site is None:
+                        continue
+                    probes.append({**result, 'id': site.id})
+                    if not result.get('stale') and self._daemon_checked.get(site.name) != result['checked_at']:
+                        self._daemon_checked[site.name] = result['checked_at']
+                        fresh.add(site.id)
+                    entry = site_result(site.name, site.url, result['success'], result['error'], result)
+                    await self._publish(sweep, {"id": site.id, **entry})
+                network_error = status['network_error']
             else:
-                all_results.append({
-                    "name": name, 
-                    "url": url, 
-                    "status": "ok", 
-                    "msg": "OK"
-                })
-
-    return JSONResponse(content={"network_error": result['network_error'], "results": all_results})
+                # The connectivity check runs alongside the probes (see iter_check_async); a
+                # filtered reference endpoint no longer turns every site into "Network Error"
+                async for result in self.monitor.iter_check_async():
+                    probes.append(result)
+                    entry = site_result(result['name'], result['url'], result['success'], result['error'], result)
+                    await self._publish(sweep, {"id": result['id'], **entry})
+                network_error = self.monitor.network_error
+
+            # Keep the snapshot in site-list order, as the dashboard lists it
+            order = {site.id: i for i, site in enumerate(sites)}
+            results = sorted(sweep.results, key=lambda r: order.get(r['id'], len(order)))
+            self.sweep_id += 1
+            self._track_changes(results)
+            raised = []
+            if self.alerts is not None and not network_error:
+                raised = self.alerts.observe_sweep(
+                    {'name': r['name'], 'success': r['status'] == 'ok', 'error': r['msg']} for r in results)
+                self.alerts.retain(r['name'] for r in results)
+                try:
+                    await asyncio.to_thread(self.alerts.save)
+                except OSError as e:
+                    self.monitor.log_error(f"Alert state save failed: {e}")
+            sweep.snapshot = {
+                "sweep_id": self.sweep_id,
+                "network_error": network_error,
+                "results": results,
+                "failed": sum(1 for r in results if r['status'] != 'ok'),
+                "alerts": raised,
+                "checked_at": time.time(),
+            }
+            self.snapshot = sweep.snapshot
+            # A daemon poll re-reads results mostly recorded already, and its duration isn't a sweep's
+            if self.metrics is not None and (fresh is None or fresh):
+                self.metrics.observe_sweep(results, time.monotonic() - started if fresh is None else None,
+                                           network_error, fresh)
+            # An outage on our side says nothing about the sites, so it doesn't replace the last known status
+            if self.snapshot_path is not None and not network_error:
+                states = None
+                if self.alerts is not None:
+                    states = {name: site['state'] for name, site in self.alerts.status().items()}
+                try:
+                    await asyncio.to_thread(save_snapshot, probes, network_error, states, self.snapshot_path)
+                except OSError as e:
+                    self.monitor.log_error(f"Snapshot save failed: {e}")
+        finally:
+            async with sweep.changed:
+                sweep.done = True
+                sweep.changed.notify_all()
+
+    def _daemon_error_snapshot(self, error):
+        """The last snapshot (or an empty one) marked with the daemon error; not cached."""
+        snapshot = self.snapshot or {
+            "sweep_id": self.sweep_id,
+            "network_error": False,
+            "results": [],
+            "failed": 0,
+            "alerts": [],
+            "checked_at": time.time(),
+        }
+        return {**snapshot, "daemon_error": error}
+
+    def _track_changes(self, results):
+        """Records which sites changed status in the current sweep."""
+        names = {r['name'] for r in results}
+        if names != self._signatures.keys():
+            self._base_id = self.sweep_id
+            self._signatures = {name: sig for name, sig in self._signatures.items() if name in names}
+            self._changed_in = {name: sid for name, sid in self._changed_in.items() if name in names}
+        for r in results:
+            signature = tuple(r.get(field) for field in CHANGE_FIELDS)
+            if self._signatures.get(r['name']) != signature:
+                self._signatures[r['name']] = signature
+                self._changed_in[r['name']] = self.sweep_id
+
+    def changes_since(self, snapshot, since):
+        """Returns (results, full): only sites that changed after sweep `since`, or every
+        result (full=True) when since is missing or can't be diffed against."""
+        if since is None or since < self._base_id or since > snapshot['sweep_id']:
+            return snapshot['results'], True
+        if since == snapshot['sweep_id']:
+            return [], False
+        return [r for r in snapshot['results'] if self._changed_in.get(r['name'], 0) > since], False
+
+    async def get(self, fresh=False):
+        """Returns the cached snapshot, sweeping first if it is stale or fresh is requested."""
+        if not fresh and self.is_fresh():
+            return self.snapshot
+        sweep = self.start(fresh)
+        # Shielded so a viewer disconnecting doesn't cancel the sweep others are waiting on
+        await asyncio.shield(sweep.task)
+        return sweep.snapshot
+
+    async def stream(self, fresh=False):
+        """Yields (event, data) pairs: each site result, then a summary.
+
+        While a stale snapshot is being replaced, it is sent first as one "snapshot" event
+        (results marked stale) so the dashboard shows the last known status meanwhile.
+        """
+        if not fresh and self.is_fresh():
+            for result in self.snapshot['results']:
+                yield "result", result
+            yield "summary", self.summary(self.snapshot)
+            return
+        if not fresh and self.snapshot is not None:
+            stale = [{**result, "stale": True} for result in self.snapshot['results']]
+            yield "snapshot", {**self.summary(self.snapshot), "results": stale}
+
+        sweep = self.start(fresh)
+        sent = 0
+        while True:
+            async with sweep.changed:
+                await sweep.changed.wait_for(lambda: sweep.done or len(sweep.results) > sent)
+                pending = sweep.results[sent:]
+                done = sweep.done
+            for result in pending:
+                yield "result", result
+            sent += len(pending)
+            if done:
+                break
+
+        if sweep.snapshot is not None:
+            yield "summary", self.summary(sweep.snapshot)
+
+    def summary(self, snapshot):
+        """Builds the summary event / response metadata for a snapshot."""
+        return {
+            "sweep_id": snapshot['sweep_id'],
+            "network_error": snapshot['network_error'],
+            "total": len(snapshot['results']),
+            "failed": snapshot['failed'],
+            "alerts": snapshot['alerts'],
+            "checked_at": snapshot['checked_at'],
+            "age": round(time.time() - snapshot['checked_at'], 1),
+            # Taken before this server started (from the snapshot file)
+            "restored": snapshot.get('restored', False),
+            # Set when the daemon couldn't be reached and the last known results are served
+            "daemon_error": snapshot.get('daemon_error'),
+        }
+
+    async def run_scheduler(self, interval):
+        """Sweeps once per interval for as long as the server runs."""
+        while True:
+            try:
+                await asyncio.shield(self.start().task)
+            except Exception as e:
+                self.monitor.log_error(f"Scheduled sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+# A daemon schedules its own probes (some sites every 30 s), so its results are read more often
+CHECK_INTERVAL = load_check_interval() if daemon is None else CLIENT_POLL_SECONDS
+sweep_cache = SweepCache(monitor, ttl=CHECK_INTERVAL, metrics=metrics,
+                         alerts=alerts if daemon is None else None, daemon=daemon,
+                         snapshot_path=os.environ.get('SNAPSHOT_FILE', SNAPSHOT_FILE))
+# Last known results from the previous run, served (as stale) until the first sweep ends
+sweep_cache.restore()
+
+@app.get("/api/check")
+async def check_websites(fresh: bool = False, since: int | None = None):
+    # Serves the shared snapshot kept current by the background scheduler; a stale cache
+    # or ?fresh=1 joins (or starts) the single in-flight sweep instead of probing again.
+    # ?since=<sweep_id> (from a previous response) returns only the sites that changed.
+    snapshot = await sweep_cache.get(fresh=fresh)
+    results, full = sweep_cache.changes_since(snapshot, since)
+    return JSONResponse(content={**sweep_cache.summary(snapshot), "results": results, "full": full})
+
+@app.get("/api/check/stream")
+async def check_websites_stream(fresh: bool = False):
+    # Streams each site's result as soon as its probe completes, then a summary event,
+    # so the dashboard fills in at the pace of the fastest sites instead of the slowest.
+    async def event_stream():
+        async for event, data in sweep_cache.stream(fresh=fresh):
+            yield sse_event(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Ad-hoc URL lists (e.g. every school homepage), queued as jobs next to the regular sweeps
+batch_queue = BatchQueue(monitor)
+
+@app.post("/api/check/batch")
+async def submit_batch(request: Request, concurrency: int | None = None, deadline: float | None = None,
+                       stream: bool = False):
+    # Body: JSON (a list of URLs / {name, url} objects, or {"urls": [...], "concurrency", "deadline"})
+    # or newline-delimited "url" / "name url" lines. Returns the queued job's id to poll,
+    # or with ?stream=1 streams its results as Server-Sent Events while it runs.
+    try:
+        entries, options = parse_batch(await request.body(), request.headers.get('content-type', ''))
+        job = batch_queue.submit(entries, concurrency or options.get('concurrency'), deadline or options.get('deadline'))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except OverflowError as e:
+        return JSONResponse(status_code=429, content={"error": str(e)})
+    if stream:
+        return batch_stream(job)
+    return JSONResponse(status_code=202, content={**job.summary(), "position": batch_queue.position(job)})
+
+def batch_stream(job, offset=0):
+    async def event_stream():
+        yield sse_event("job", job.summary())
+        async for result in job.stream(offset):
+            yield sse_event("result", result)
+        yield sse_event("summary", job.summary())
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/check/batch/{job_id}")
+async def batch_status(job_id: str, offset: int = 0):
+    # Polling: the job's progress plus its results from `offset` on (pass back `next_offset`)
+    job = batch_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"작업을 찾을 수 없습니다: {job_id}"})
+    results = job.results[offset:]
+    return JSONResponse(content={**job.summary(), "position": batch_queue.position(job),
+                                 "results": results, "next_offset": offset + len(results)})
+
+@app.get("/api/check/batch/{job_id}/stream")
+async def batch_status_stream(job_id: str, offset: int = 0):
+    job = batch_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"작업을 찾을 수 없습니다: {job_id}"})
+    return batch_stream(job, offset)
+
+@app.delete("/api/check/batch/{job_id}")
+async def cancel_batch(job_id: str):
+    job = batch_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"작업을 찾을 수 없습니다: {job_id}"})
+    await batch_queue.cancel(job)
+    return JSONResponse(content=job.summary())
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Served from the last sweep's results; a scrape never triggers probes. The per-site
+    # block is rendered once per sweep (off the event loop) and reused by later scrapes.
+    # With a daemon, this process's probe pool sits idle: its gauges would say nothing
+    body = await asyncio.to_thread(metrics.render, monitor.pool_stats() if daemon is None else None)
+    return Response(content=body, media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/alerts")
+async def alert_status():
+    # Confirmed per-site states (a single failed probe only makes a site SUSPECT) and recent alerts;
+    # with a daemon, its alert engine is the one that counts
+    if daemon is not None:
+        try:
+            status = await asyncio.to_thread(daemon.status)
+        except (OSError, ValueError) as e:
+            monitor.log_error(f"Daemon unreachable ({daemon.url}): {e}")
+            return JSONResponse(status_code=502, content={"error": f"모니터링 데몬에 연결할 수 없습니다: {e}"})
+        sites, recent = status.get('states', {}), status.get('alerts', [])
+    else:
+        sites, recent = alerts.status(), list(alerts.recent)
+    return JSONResponse(content={
+        "down": sorted(name for name, site in sites.items() if site['state'] in (DOWN, RECOVERING)),
+        "sites": sites,
+        "recent": recent,
+    })
+
+@app.post("/api/content/accept")
+async def accept_content(site: str):
+    # After an intended redesign: forget the site's page fingerprint so the next probe sets a new one
+    entry = monitor.sites.by_name(site)
+    if entry is None:
+        return JSONResponse(status_code=404, content={"error": f"사이트를 찾을 수 없습니다: {site}"})
+    monitor.content_baselines.accept(entry.url)
+    return JSONResponse(content={"site": site, "accepted": True})
+
+def history_window(start, end):
+    """Resolves optional start/end query params (epoch seconds); defaults to the last 24 hours."""
+    end = time.time() if end is None else end
+    start = end - 24 * 3600 if start is None else start
+    return start, end
+
+@app.get("/api/history/uptime")
+async def history_uptime(site: str | None = None, start: float | None = None, end: float | None = None):
+    start, end = history_window(start, end)
+    data = await asyncio.to_thread(history.uptime, start, end, site)
+    return JSONResponse(content={"start": start, "end": end, "sites": data})
+
+@app.get("/api/history/latency")
+async def history_latency(site: str | None = None, start: float | None = None, end: float | None = None):
+    start, end = history_window(start, end)
+    data = await asyncio.to_thread(history.latency, start, end, site)
+    return JSONResponse(content={"start": start, "end": end, "sites": data})
+
+@app.get("/api/history/outages")
+async def history_outages(site: str | None = None, start: float | None = None, end: float | None = None):
+    start, end = history_window(start, end)
+    data = await asyncio.to_thread(history.outages, start, end, site)
+    return JSONResponse(content={"start": start, "end": end, "sites": data})
+
+async def watch_site_list():
+    """Picks up edits to the site list file without a restart; the next sweep uses them."""
+    while True:
+        await asyncio.sleep(SITE_RELOAD_INTERVAL)
+        if await asyncio.to_thread(monitor.reload_urls) and daemon is None:
+            await monitor.prewarm_dns_async()
+
+@app.on_event("startup")
+async def start_scheduler():
+    # Resolve every monitored host before the first sweep, then keep the DNS cache warm
+    # (not with a daemon: it does the probing, this process only reads its results)
+    app.state.dns_refresh = None
+    if daemon is None:
+        await monitor.prewarm_dns_async()
+        app.state.dns_refresh = asyncio.ensure_future(monitor.dns_cache.refresh_forever(monitor.get_hosts))
+    app.state.scheduler = asyncio.ensure_future(sweep_cache.run_scheduler(CHECK_INTERVAL))
+    app.state.site_reload = asyncio.ensure_future(watch_site_list())
+    batch_queue.start()
+
+@app.on_event("shutdown")
+async def close_monitor():
+    app.state.scheduler.cancel()
+    if app.state.dns_refresh is not None:
+        app.state.dns_refresh.cancel()
+    app.state.site_reload.cancel()
+    await batch_queue.stop()
+    await monitor.aclose()
+    history.close()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,145 @@
+import bisect
+import threading
+import time
+
+# Probe latency histogram buckets (seconds); the last one matches REQUEST_TIMEOUT
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    """Escapes a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class SiteSeries:
+    __slots__ = ('labels', 'up', 'buckets', 'latency_sum', 'latency_count', 'errors')
+
+    def __init__(self):
+        self.labels = ''
+        self.up = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.errors = {}
+
+
+class ProbeMetrics:
+    """Prometheus text exposition of sweep results and monitor internals.
+
+    Sweeps feed it once each (observe_sweep); scrapes never probe. The per-site part,
+    which is almost all of the output for large site lists, is rendered once per sweep
+    and reused by every scrape until the next one, so a scrape costs a string join
+    plus a handful of live gauges.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sites = {}
+        self._sweeps = 0
+        self._sweep_duration = None
+        self._sweep_timestamp = None
+        self._network_errors = 0
+        self._rendered = None
+        self._rendered_sweep = None
+
+    def observe_sweep(self, results, duration, network_error=False, fresh=None):
+        """Records one finished sweep (the per-site dicts sent to the frontend).
+
+        fresh is the set of site ids probed since the last call (None: all of them); the
+        others only refresh their up gauge, so re-read results aren't counted twice. A
+        duration of None leaves the sweep duration and timestamp gauges as they are.
+        """
+        with self._lock:
+            sites = {}
+            for r in results:
+                series = self._sites.get(r['id']) or SiteSeries()
+                series.labels = f'site_id="{r["id"]}",site="{escape_label(r["name"])}"'
+                series.up = 1 if r['status'] == 'ok' else 0
+                sites[r['id']] = series
+                if fresh is not None and r['id'] not in fresh:
+                    continue
+                if series.up and r.get('latency_ms') is not None:
+                    seconds = r['latency_ms'] / 1000
+                    series.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+                    series.latency_sum += seconds
+                    series.latency_count += 1
+                elif not series.up:
+                    error_class = r.get('error_class') or ('network' if network_error else 'unknown')
+                    series.errors[error_class] = series.errors.get(error_class, 0) + 1
+            # Sites dropped from the site list stop being exported
+            self._sites = sites
+            self._sweeps += 1
+            if duration is not None:
+                self._sweep_duration = duration
+                self._sweep_timestamp = time.time()
+            if network_error:
+                self._network_errors += 1
+
+    def _render_sites(self):
+        up = ['# HELP edumonitor_site_up 1 if the site passed its last probe.', '# TYPE edumonitor_site_up gauge']
+        latency = ['# HELP edumonitor_probe_duration_seconds Latency of successful probes.',
+                   '# TYPE edumonitor_probe_duration_seconds histogram']
+        errors = ['# HELP edumonitor_probe_errors_total Failed probes by error class.',
+                  '# TYPE edumonitor_probe_errors_total counter']
+        les = [f'{le:g}' for le in LATENCY_BUCKETS] + ['+Inf']
+
+        for series in self._sites.values():
+            labels = series.labels
+            up.append(f'edumonitor_site_up{{{labels}}} {series.up}')
+            cumulative = 0
+            for le, count in zip(les, series.buckets):
+                cumulative += count
+                latency.append(f'edumonitor_probe_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            latency.append(f'edumonitor_probe_duration_seconds_sum{{{labels}}} {series.latency_sum:.6f}')
+            latency.append(f'edumonitor_probe_duration_seconds_count{{{labels}}} {series.latency_count}')
+            for error_class, count in series.errors.items():
+                errors.append(f'edumonitor_probe_errors_total{{{labels},error_class="{error_class}"}} {count}')
+        return '\n'.join(up + latency + errors) + '\n'
+
+    def render(self, pool=None):
+        """Returns the exposition text; pool is WebsiteMonitor.pool_stats() for the live gauges."""
+        with self._lock:
+            if self._rendered_sweep != self._sweeps:
+                self._rendered = self._render_sites()
+                self._rendered_sweep = self._sweeps
+            lines = [
+                '# HELP edumonitor_sweeps_total Completed sweeps.',
+                '# TYPE edumonitor_sweeps_total counter',
+                f'edumonitor_sweeps_total {self._sweeps}',
+                '# HELP edumonitor_sweep_network_errors_total Sweeps whose failures were put down to a local network outage rather than the sites.',
+                '# TYPE edumonitor_sweep_network_errors_total counter',
+                f'edumonitor_sweep_network_errors_total {self._network_errors}',
+            ]
+            if self._sweep_duration is not None:
+                lines += [
+                    '# HELP edumonitor_sweep_duration_seconds Wall time of the last sweep.',
+                    '# TYPE edumonitor_sweep_duration_seconds gauge',
+                    f'edumonitor_sweep_duration_seconds {self._sweep_duration:.3f}',
+                    '# HELP edumonitor_last_sweep_timestamp_seconds When the last sweep finished.',
+                    '# TYPE edumonitor_last_sweep_timestamp_seconds gauge',
+                    f'edumonitor_last_sweep_timestamp_seconds {self._sweep_timestamp:.3f}',
+                ]
+            rendered = self._rendered
+
+        if pool is not None:
+            lines += [
+                '# HELP edumonitor_probes_queued Probes waiting for a rate-limit token or a probe slot.',
+                '# TYPE edumonitor_probes_queued gauge',
+                f'edumonitor_probes_queued {pool["queued"]}',
+                '# HELP edumonitor_probes_in_flight Probes currently running.',
+                '# TYPE edumonitor_probes_in_flight gauge',
+                f'edumonitor_probes_in_flight {pool["in_flight"]}',
+                '# HELP edumonitor_probe_slots Maximum concurrent probes.',
+                '# TYPE edumonitor_probe_slots gauge',
+                f'edumonitor_probe_slots {pool["slots"]}',
+                '# HELP edumonitor_pool_utilization Share of probe slots in use.',
+                '# TYPE edumonitor_pool_utilization gauge',
+                f'edumonitor_pool_utilization {pool["in_flight"] / pool["slots"]:.3f}',
+                '# HELP edumonitor_pool_connections Pooled HTTP connections.',
+                '# TYPE edumonitor_pool_connections gauge',
+                f'edumonitor_pool_connections{{state="active"}} {pool["connections_active"]}',
+                f'edumonitor_pool_connections{{state="idle"}} {pool["connections_idle"]}',
+            ]
+        return '\n'.join(lines) + '\n' + rendered
@@ -1,10 +1,19 @@
 
 import flet as ft
 from monitor import WebsiteMonitor
+from daemon import daemon_client
+from snapshot import save_snapshot, load_snapshot
 import threading
 import time
 
 URL_FILE = '지역교육청_url.txt'
+# Its own snapshot: the tray's last_sweep.json also carries alert states this app doesn't track
+SNAPSHOT_FILE = 'last_sweep_mobile.json'
+
+# Minimum seconds between page updates while a sweep is streaming results
+UI_UPDATE_INTERVAL = 0.1
+# Fixed card height; lets the ListView lay out only the visible rows (virtualization)
+CARD_HEIGHT = 86
 
 class EduMonitorApp:
     def __init__(self, page: ft.Page):
@@ -18,8 +27,18 @@ class EduMonitorApp:
         
         self.monitor = WebsiteMonitor()
         self.monitor.load_urls(URL_FILE)
+        # With "daemon_url" in settings.json, Check Now asks a headless daemon instead of probing here
+        self.daemon = daemon_client()
+        if self.daemon is None:
+            self.monitor.start_dns_refresh()
+        # Sites whose card shows a result (current or from the snapshot of the previous run)
+        self.known = set()
         
         self.init_ui()
+        self.show_snapshot()
+        # Fresh check in the background (with a daemon, just its latest results); cards keep
+        # their last known status until it reports
+        self.start_check_thread(None, force=False)
 
     def init_ui(self):
         # --- App Bar ---
@@ -33,7 +52,9 @@ class EduMonitorApp:
         )
 
         # --- Main List ---
-        self.site_list_view = ft.ListView(expand=1, spacing=10, padding=20)
+        # site name -> ListTile, so a result updates its card without scanning the list
+        self.site_tiles = {}
+        self.site_list_view = ft.ListView(expand=1, spacing=10, padding=20, item_extent=CARD_HEIGHT)
         self.load_sites_into_list()
         
         # --- Loading Indicator (Hidden by default) ---
@@ -62,6 +83,7 @@ class EduMonitorApp:
 
     def load_sites_into_list(self):
         self.site_list_view.controls.clear()
+        self.site_tiles.clear()
         urls = self.monitor.get_urls()
         
         if not urls:
@@ -69,85 +91,134 @@ class EduMonitorApp:
             return
 
         for name, url in urls.items():
+            tile = ft.ListTile(
+                leading=ft.Icon(ft.Icons.CIRCLE_OUTLINED, color=ft.Colors.GREY),
+                title=ft.Text(name, weight="bold"),
+                subtitle=ft.Text(url, max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
+            )
             card = ft.Card(
-                content=ft.Container(
-                    content=ft.Column(
-                        [
-                            ft.ListTile(
-                                leading=ft.Icon(ft.Icons.CIRCLE_OUTLINED, color=ft.Colors.GREY),
-                                title=ft.Text(name, weight="bold"),
-                                subtitle=ft.Text(url, max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
-                            )
-                        ]
-                    ),
-                    padding=10,
-                ),
+                content=ft.Container(content=tile, padding=10),
                 data=url # Store URL in data for easier access if needed
             )
+            self.site_tiles[name] = tile
             self.site_list_view.controls.append(card)
         
         self.page.update()
 
-    def start_check_thread(self, e):
+    def show_snapshot(self):
+        """Shows the last saved results (marked as last known) until the first check reports."""
+        snapshot = load_snapshot(SNAPSHOT_FILE)
+        if snapshot is None:
+            return
+        for probe in snapshot['results']:
+            self.update_tile(probe)
+        saved_at = time.strftime('%m-%d %H:%M', time.localtime(snapshot['saved_at']))
+        self.status_text.value = f"Last known status ({saved_at})"
+        self.page.update()
+
+    def start_check_thread(self, e, force=True):
         if self.progress_ring.visible:
             return  # Already checking
         
         self.progress_ring.visible = True
         self.check_fab.disabled = True
-        self.status_text.value = "Checking Network..."
+        self.status_text.value = "Checking Sites..."
         self.page.update()
         
-        threading.Thread(target=self.run_check, daemon=True).start()
+        threading.Thread(target=self.run_check, args=(force,), daemon=True).start()
 
-    def run_check(self):
-        # 1. Network Check
-        is_net_ok = self.monitor.check_network()
-        if not is_net_ok:
-            self.finish_check("Network Error", False, [])
+    def run_check(self, force=True):
+        if self.daemon is not None:
+            self.run_daemon_check(force)
             return
 
         self.update_status_safe("Checking Sites...")
 
-        # 2. Check Sites
+        # Check Sites (picking up edits to the site list file since the last check); the
+        # network check runs alongside the probes and is decided once they are done
+        if self.monitor.reload_urls():
+            self.load_sites_into_list()
         urls = self.monitor.get_urls()
         total = len(urls)
         failed_sites = []
+        results = []
         
-        # Reset icons to loading
-        for control in self.site_list_view.controls:
-             if isinstance(control, ft.Card):
-                tile = control.content.content.controls[0]
+        # Reset icons to loading (cards with a last known result keep it until this check reports)
+        for name, tile in self.site_tiles.items():
+            if name not in self.known:
                 tile.leading.name = ft.Icons.HOURGLASS_EMPTY
                 tile.leading.color = ft.Colors.BLUE
         self.page.update()
 
-        for i, (name, url) in enumerate(urls.items()):
-            # Find the card for this site
-            card = None
-            for c in self.site_list_view.controls:
-                if isinstance(c, ft.Card) and c.data == url:
-                    card = c
-                    break
-            
-            success, error = self.monitor.check_site(url)
+        # All sites are probed in parallel; cards update as each result arrives, but the
+        # page is pushed at most every UI_UPDATE_INTERVAL so thousands of results don't
+        # turn into thousands of full-page diffs.
+        last_update = time.monotonic()
+        for i, probe in enumerate(self.monitor.iter_check(), 1):
+            name = probe['name']
+            results.append(probe)
+            if not probe['success']:
+                failed_sites.append({'name': name, 'error': probe['error'], 'probe': probe})
             
             # Update individual item
-            if card:
-                tile = card.content.content.controls[0]
-                if success:
-                    tile.leading.name = ft.Icons.CHECK_CIRCLE
-                    tile.leading.color = ft.Colors.GREEN
-                else:
-                    tile.leading.name = ft.Icons.ERROR
-                    tile.leading.color = ft.Colors.RED
-                    failed_sites.append({'name': name, 'error': error})
+            self.update_tile(probe)
+
+            now = time.monotonic()
+            if now - last_update >= UI_UPDATE_INTERVAL:
+                self.status_text.value = f"Checking Sites... ({i}/{total})"
                 self.page.update()
+                last_update = now
         
+        if self.monitor.network_error:
+            self.finish_check("Network Error", False, [])
+            return
+        self.save_snapshot(results)
         if failed_sites:
             self.finish_check("Issues Found", False, failed_sites)
         else:
             self.finish_check("All Good", True, [])
 
+    def update_tile(self, probe):
+        tile = self.site_tiles.get(probe['name'])
+        if tile:
+            if probe['success']:
+                tile.leading.name = ft.Icons.CHECK_CIRCLE
+                tile.leading.color = ft.Colors.GREEN
+            else:
+                tile.leading.name = ft.Icons.ERROR
+                tile.leading.color = ft.Colors.RED
+            latency = f"{probe['latency_ms']:.0f}ms" if probe['latency_ms'] is not None else "-"
+            tile.subtitle.value = f"{probe['url']} · {latency}" + (" · last known" if probe.get('stale') else "")
+            self.known.add(probe['name'])
+
+    def save_snapshot(self, results):
+        try:
+            save_snapshot(results, path=SNAPSHOT_FILE)
+        except OSError as e:
+            self.monitor.log_error(f"Snapshot save failed: {e}")
+
+    def run_daemon_check(self, force):
+        # Check Now asks the daemon to probe every site; at startup its latest results are enough
+        self.update_status_safe("Checking Sites (daemon)..." if force else "Loading daemon status...")
+        if self.monitor.reload_urls():
+            self.load_sites_into_list()
+        try:
+            result = self.daemon.check() if force else self.daemon.status()
+        except (OSError, ValueError) as e:
+            self.finish_check(f"Daemon unreachable: {e}", False, [])
+            return
+
+        for probe in result['results']:
+            self.update_tile(probe)
+        if result['network_error']:
+            self.finish_check("Network Error", False, [])
+            return
+        self.save_snapshot(result['results'])
+        if result['failed_sites']:
+            self.finish_check("Issues Found", False, result['failed_sites'])
+        else:
+            self.finish_check("All Good", True, [])
+
     def update_status_safe(self, text):
         self.status_text.value = text
         self.page.update()
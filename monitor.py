@@ -1,136 +1,1067 @@
+import asyncio
+import contextvars
+import errno
+import ssl
+import threading
+import queue
+import random
+import socket
+import time
+from urllib.parse import urlsplit
+import aiohttp
+import aiohttp.abc
+from registry import SiteRegistry
+from checklog import get_logger
+from fingerprint import PageFingerprint, ContentBaselines, CONTENT_MAX_BYTES, CONTENT_CHUNK_BYTES
+from httpcache import ValidatorCache
 
-import requests
-import subprocess
-import platform
-import urllib3
+try:
+    import aiodns
+except ImportError:
+    # Optional: without aiodns the system resolver is used and cached for DNS_DEFAULT_TTL
+    aiodns = None
 
-# Suppress InsecureRequestWarning specifically for this use case
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Use minimal headers that were proven to work in debug_site.py
+# Avoid Referer/Origin/Sec-Fetch headers as they cause 400 Bad Request on goedy.kr
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Connection': 'keep-alive'
+}
+
+REQUEST_TIMEOUT = 15
+
+# Adaptive timeouts: once a site has MIN_LATENCY_SAMPLES successful probes, its timeouts
+# become TIMEOUT_FACTOR x its estimated p99 latency (EWMA mean + 3 stddev), clamped to
+# [MIN_TIMEOUT, REQUEST_TIMEOUT] overall and [MIN_CONNECT_TIMEOUT, MAX_CONNECT_TIMEOUT] for connect.
+LATENCY_EWMA_ALPHA = 0.2
+MIN_LATENCY_SAMPLES = 5
+TIMEOUT_FACTOR = 3
+MIN_TIMEOUT = 2.0
+MIN_CONNECT_TIMEOUT = 1.0
+MAX_CONNECT_TIMEOUT = 5.0
+# Each retry gets this much more time than the previous attempt (up to the bounds above)
+RETRY_TIMEOUT_FACTOR = 2
+
+# Retries: exponential backoff with full jitter, and a budget so a regional outage
+# can't double the probe load: every first attempt earns RETRY_BUDGET_RATIO of a retry.
+MAX_RETRIES = 1
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 4.0
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MIN = 10
+RETRY_BUDGET_MAX = 100
+
+# How a site is probed:
+#   head   - HEAD request, falling back to a streamed GET if the server rejects HEAD
+#   stream - GET that stops after the headers and the first PARTIAL_BODY_BYTES of the body
+#   full   - GET that downloads the whole page
+#   content - GET that fingerprints the page as it streams in and compares it with the
+#            site's baseline and required keywords (see fingerprint.py)
+PROBE_STRATEGIES = ('head', 'stream', 'full', 'content')
+DEFAULT_PROBE_STRATEGY = 'stream'
+PARTIAL_BODY_BYTES = 1024
+
+# Global cap on probes in flight, and on pooled connections per host
+MAX_CONCURRENCY = 100
+LIMIT_PER_HOST = 2
+
+# DNS cache: record TTLs (clamped to [DNS_MIN_TTL, DNS_MAX_TTL]) are honoured when aiodns
+# is available. Failures are cached for DNS_NEGATIVE_TTL, and entries in the last
+# DNS_REFRESH_AHEAD of their life are refreshed in the background.
+DNS_DEFAULT_TTL = 300
+DNS_MIN_TTL = 30
+DNS_MAX_TTL = 3600
+DNS_NEGATIVE_TTL = 30
+DNS_REFRESH_AHEAD = 0.2
+DNS_REFRESH_INTERVAL = 10
+
+# Politeness: requests per second and burst size allowed against a single host.
+# WAF-protected portals can be slowed further with per-domain overrides.
+HOST_RATE = 2.0
+HOST_BURST = 2
+
+# Connectivity: the network counts as up if any reference endpoint accepts a TCP connection
+# within NETWORK_TIMEOUT. They are raced, so one filtered path (8.8.8.8:53 is blocked on some
+# government networks) can't fail the check, and the verdict is reused for NETWORK_CHECK_TTL.
+NETWORK_ENDPOINTS = ('8.8.8.8:53', '1.1.1.1:53', '168.126.63.1:53', 'www.naver.com:443')
+NETWORK_TIMEOUT = 3
+NETWORK_CHECK_TTL = 30
+# With no endpoint reachable, a sweep is a local outage only if more than OUTAGE_DOMAIN_SHARE
+# of the unrelated domains probed (at least OUTAGE_MIN_DOMAINS, else all of them) got no
+# answer at all; if most sites answered, the endpoints are just filtered.
+OUTAGE_MIN_DOMAINS = 3
+OUTAGE_DOMAIN_SHARE = 0.5
+TRANSPORT_ERROR_CLASSES = ('timeout', 'dns', 'connect')
+
+# Korean second-level labels (goe.go.kr, school.es.kr, ...) that belong to the registrable domain
+KR_SECOND_LEVEL = {'go', 'or', 'co', 'ac', 're', 'ne', 'pe', 'es', 'ms', 'hs', 'sc', 'kg'}
+
+
+def translate_error(error_msg):
+    """Translates a raw exception message into a user-facing Korean message."""
+    msg = str(error_msg).lower()
+    if "name or service not known" in msg or "getaddrinfo failed" in msg:
+        return "사이트 주소(도메인)를 찾을 수 없습니다."
+    if "connect" in msg and "refused" in msg:
+        return "사이트 연결이 거부되었습니다. (서버 다운 추정)"
+    if "timed out" in msg or "timeout" in msg:
+        return "응답 시간이 초과되었습니다. (접속 지연)"
+    if "ssl" in msg or "certificate" in msg:
+        return "보안 인증서 오류가 발생했습니다."
+    if "404" in msg:
+        return "페이지를 찾을 수 없습니다. (404 Not Found)"
+    if "400" in msg:
+        return "잘못된 요청(400): 방화벽 차단 의심 (재시도 중)"
+    if "500" in msg:
+        return "서버 내부 오류입니다. (500 Internal Server Error)"
+    if "502" in msg or "503" in msg:
+        return "서버가 일시적으로 사용 불가능합니다. (502/503)"
+    return f"접속 실패: {error_msg}"
+
+
+def describe_exception(exc):
+    """Returns a message for an exception in the wording translate_error expects."""
+    # asyncio timeouts have an empty str()
+    if isinstance(exc, asyncio.TimeoutError):
+        return "Request timed out"
+    if isinstance(exc, (aiohttp.ClientSSLError, aiohttp.ServerFingerprintMismatch)):
+        return f"SSL error: {exc}"
+    # aiohttp prefixes connect errors with "ssl:False", so report the underlying OS error only
+    if isinstance(exc, aiohttp.ClientConnectorError):
+        if exc.os_error.errno == errno.ECONNREFUSED:
+            return "Connection refused"
+        return str(exc.os_error) or exc.__class__.__name__
+    return str(exc) or exc.__class__.__name__
+
+
+def registrable_domain(host):
+    """Returns the registrable domain of a host, e.g. www.goeujb.kr -> goeujb.kr."""
+    labels = host.lower().rstrip('.').split('.')
+    if len(labels) >= 3 and labels[-1] == 'kr' and labels[-2] in KR_SECOND_LEVEL:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations, so waiters are served in arrival order."""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def reserve(self, now):
+        """Takes one token and returns how long the caller must wait before using it."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class HostRateLimiter:
+    """Per-host (or per-domain) token-bucket scheduler for outgoing probes.
+
+    overrides maps a domain to its own requests-per-second rate; it applies to the
+    domain and all of its subdomains, the most specific match winning.
+    """
+
+    def __init__(self, rate=HOST_RATE, burst=HOST_BURST, overrides=None, key='host'):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = dict(overrides or {})
+        self.key = key
+        self._buckets = {}
+
+    def key_for(self, url):
+        """Returns the bucket key for a URL: its host, or its registrable domain."""
+        host = (urlsplit(url).hostname or '').lower()
+        if self.key == 'domain':
+            return registrable_domain(host)
+        return host
+
+    def rate_for(self, key):
+        """Returns the configured rate for a bucket key, honouring overrides."""
+        labels = key.split('.')
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            if suffix in self.overrides:
+                return self.overrides[suffix]
+        return self.rate
+
+    def set_override(self, domain, rate):
+        """Sets the rate for a domain and drops buckets so the new rate applies at once."""
+        self.overrides[domain.lower()] = rate
+        self._buckets.clear()
+
+    def delay_for(self, url, now=None):
+        """Reserves a slot for the URL's host and returns the seconds to wait for it."""
+        if now is None:
+            now = time.monotonic()
+        key = self.key_for(url)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate = self.rate_for(key)
+            # A burst never exceeds one second's worth of requests, so a host configured
+            # for N requests per second really sees at most N in any second
+            burst = max(1, min(self.burst, rate))
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+        return bucket.reserve(now)
+
+    async def acquire(self, url):
+        """Waits until the URL's host may be probed again."""
+        delay = self.delay_for(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def classify_error(exc):
+    """Returns a short, stable error class for an exception (stored in history)."""
+    if isinstance(exc, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(exc, (aiohttp.ClientSSLError, aiohttp.ServerFingerprintMismatch)):
+        return 'ssl'
+    if isinstance(exc, aiohttp.ClientConnectorDNSError):
+        return 'dns'
+    if isinstance(exc, aiohttp.ClientConnectorError):
+        if exc.os_error.errno == errno.ECONNREFUSED:
+            return 'refused'
+        return 'connect'
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return f'http_{exc.status}'
+    return 'protocol'
+
+
+# Monotonic timestamps of the probe attempt running in the current task
+_phase_marks = contextvars.ContextVar('phase_marks', default=None)
+
+# (aiohttp trace event, mark name) pairs recorded for every request
+TRACE_MARKS = (
+    ('on_request_start', 'request_start'),
+    ('on_connection_queued_start', 'queued_start'),
+    ('on_connection_queued_end', 'queued_end'),
+    ('on_connection_create_start', 'connect_start'),
+    ('on_dns_resolvehost_start', 'dns_start'),
+    ('on_dns_resolvehost_end', 'dns_end'),
+    ('on_connection_create_end', 'connect_end'),
+    ('on_request_headers_sent', 'headers_sent'),
+    ('on_request_end', 'response_start'),
+)
+
+
+class TimingSSLContext(ssl.SSLContext):
+    """SSL context that marks when the TLS handshake starts.
+
+    asyncio wraps the socket only once the TCP connect has finished, so this mark
+    splits aiohttp's single "connection created" span into TCP and TLS parts.
+    """
+
+    def wrap_bio(self, *args, **kwargs):
+        marks = _phase_marks.get()
+        if marks is not None:
+            marks['tls_start'] = time.monotonic()
+        return super().wrap_bio(*args, **kwargs)
+
+
+def make_ssl_context():
+    """Returns a non-verifying client context (handles self-signed or local government certs)."""
+    context = TimingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def make_trace_config():
+    """Returns a TraceConfig that stores event times in the request's trace_request_ctx dict."""
+    trace_config = aiohttp.TraceConfig()
+
+    def marker(name):
+        async def on_event(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx[name] = time.monotonic()
+        return on_event
+
+    for event, name in TRACE_MARKS:
+        getattr(trace_config, event).append(marker(name))
+    return trace_config
+
+
+def phase_timings(marks):
+    """Turns the marks of one attempt into phase durations in ms (None if a phase didn't happen).
+
+    dns_ms, connect_ms (TCP) and tls_ms are None when a pooled connection was reused.
+    ttfb_ms runs from the request being sent to the response headers arriving, and
+    total_ms from request start to the end of the body, excluding time queued for a
+    pooled connection.
+    """
+    def span(start, end):
+        if start in marks and end in marks:
+            return round((marks[end] - marks[start]) * 1000, 1)
+        return None
+
+    tcp_start = 'dns_end' if 'dns_end' in marks else 'connect_start'
+    tcp_end = 'tls_start' if 'tls_start' in marks else 'connect_end'
+    total = span('request_start', 'finished')
+    queued = span('queued_start', 'queued_end')
+    if total is not None and queued is not None:
+        total = round(total - queued, 1)
+    return {
+        'dns_ms': span('dns_start', 'dns_end'),
+        'connect_ms': span(tcp_start, tcp_end),
+        'tls_ms': span('tls_start', 'connect_end'),
+        'ttfb_ms': span('headers_sent', 'response_start'),
+        'total_ms': total,
+    }
+
+
+class LatencyStats:
+    """Exponentially weighted mean and variance of one latency series (ms)."""
+    __slots__ = ('mean', 'var', 'count')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def add(self, value):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            incr = LATENCY_EWMA_ALPHA * diff
+            self.mean += incr
+            self.var = (1 - LATENCY_EWMA_ALPHA) * (self.var + diff * incr)
+        self.count += 1
+
+    def p99(self):
+        """Rough p99 estimate (mean + 3 stddev)."""
+        return self.mean + 3 * self.var ** 0.5
+
+
+class AdaptiveTimeoutPolicy:
+    """Per-site timeouts derived from latency history, plus retry backoff and budget.
+
+    Dead sites get a verdict in a few seconds, since a site that usually answers in
+    80 ms no longer waits the full REQUEST_TIMEOUT. Sites known to be slow keep a
+    correspondingly long timeout.
+    """
+
+    def __init__(self, max_retries=MAX_RETRIES):
+        self.max_retries = max_retries
+        self._total = {}
+        self._connect = {}
+        self._retry_tokens = float(RETRY_BUDGET_MIN)
+
+    def observe(self, url, timings):
+        """Feeds the phase timings of a successful probe into the site's statistics."""
+        if timings['total_ms'] is not None:
+            self._total.setdefault(url, LatencyStats()).add(timings['total_ms'])
+        # Only fresh connections have a connect phase
+        if timings['connect_ms'] is not None:
+            connect_ms = timings['connect_ms'] + (timings['tls_ms'] or 0)
+            self._connect.setdefault(url, LatencyStats()).add(connect_ms)
+
+    def timeout_for(self, url, attempt=0, limit=REQUEST_TIMEOUT):
+        """Returns the aiohttp.ClientTimeout for the given attempt (0 = first) at a URL.
+
+        limit caps the total timeout (a site's own "timeout" setting, else REQUEST_TIMEOUT).
+        """
+        scale = RETRY_TIMEOUT_FACTOR ** attempt
+        total = limit
+        connect = MAX_CONNECT_TIMEOUT
+        stats = self._total.get(url)
+        if stats is not None and stats.count >= MIN_LATENCY_SAMPLES:
+            total = min(limit, max(MIN_TIMEOUT, stats.p99() / 1000 * TIMEOUT_FACTOR) * scale)
+        stats = self._connect.get(url)
+        if stats is not None and stats.count >= MIN_LATENCY_SAMPLES:
+            connect = min(MAX_CONNECT_TIMEOUT, max(MIN_CONNECT_TIMEOUT, stats.p99() / 1000 * TIMEOUT_FACTOR) * scale)
+        return aiohttp.ClientTimeout(total=total, sock_connect=min(connect, total))
+
+    def record_request(self):
+        """Earns a fraction of a retry for every first attempt."""
+        self._retry_tokens = min(RETRY_BUDGET_MAX, self._retry_tokens + RETRY_BUDGET_RATIO)
+
+    def can_retry(self, attempt):
+        """Returns True (and spends budget) if another attempt is allowed after the given one."""
+        if attempt >= self.max_retries or self._retry_tokens < 1:
+            return False
+        self._retry_tokens -= 1
+        return True
+
+    def backoff(self, attempt):
+        """Seconds to wait before retry number attempt (1-based): exponential with full jitter."""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+class DNSCacheEntry:
+    __slots__ = ('addresses', 'error', 'expires', 'ttl')
+
+    def __init__(self, addresses, error, ttl):
+        self.addresses = addresses
+        self.error = error
+        self.ttl = ttl
+        self.expires = time.monotonic() + ttl
+
+
+class CachingResolver(aiohttp.abc.AbstractResolver):
+    """aiohttp resolver that caches lookups per host with TTLs, off the probe hot path.
+
+    The cache is shared by every event loop the monitor runs on. Hosts can be
+    pre-resolved (prewarm) and kept fresh by refresh_forever, so a sweep normally
+    never waits for the resolver. Failed lookups raise socket.gaierror, which aiohttp
+    reports as ClientConnectorDNSError (error class 'dns').
+    """
 
-class WebsiteMonitor:
     def __init__(self):
-        self.urls = {}
+        self._entries = {}
+        self._resolvers = {}
+        self._refreshing = set()
+
+    async def _lookup(self, host):
+        """Returns ([(family, address), ...], ttl) from aiodns or the system resolver."""
+        loop = asyncio.get_running_loop()
+        if aiodns is not None:
+            resolver = self._resolvers.get(loop)
+            if resolver is None:
+                resolver = self._resolvers[loop] = aiodns.DNSResolver()
+            try:
+                result = await resolver.getaddrinfo(host, family=socket.AF_UNSPEC, port=None, type=socket.SOCK_STREAM)
+            except aiodns.error.DNSError as e:
+                raise socket.gaierror(socket.EAI_NONAME, f"Name or service not known ({e.args[-1]})")
+            addresses = [(node.family, node.addr[0].decode()) for node in result.nodes]
+            ttl = min((node.ttl for node in result.nodes), default=DNS_DEFAULT_TTL)
+            return addresses, min(DNS_MAX_TTL, max(DNS_MIN_TTL, ttl))
+
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return [(family, sockaddr[0]) for family, _, _, _, sockaddr in infos], DNS_DEFAULT_TTL
+
+    async def lookup(self, host):
+        """Resolves a host now and stores the answer (or the failure) in the cache."""
+        try:
+            addresses, ttl = await self._lookup(host)
+            entry = DNSCacheEntry(list(dict.fromkeys(addresses)), None, ttl)
+        except OSError as e:
+            entry = DNSCacheEntry([], e, DNS_NEGATIVE_TTL)
+        self._entries[host] = entry
+        return entry
+
+    async def _refresh(self, host):
+        try:
+            await self.lookup(host)
+        finally:
+            self._refreshing.discard(host)
+
+    def _needs_refresh(self, entry, now):
+        return entry.expires - now < entry.ttl * DNS_REFRESH_AHEAD
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        now = time.monotonic()
+        entry = self._entries.get(host)
+        if entry is None or entry.expires <= now:
+            entry = await self.lookup(host)
+        elif self._needs_refresh(entry, now) and host not in self._refreshing:
+            # Serve the cached answer and refresh it in the background
+            self._refreshing.add(host)
+            asyncio.ensure_future(self._refresh(host))
+
+        if entry.error is not None:
+            raise socket.gaierror(entry.error.errno, entry.error.strerror)
+        results = [
+            {'hostname': host, 'host': address, 'port': port, 'family': addr_family,
+             'proto': 0, 'flags': socket.AI_NUMERICHOST}
+            for addr_family, address in entry.addresses
+            if family in (socket.AF_UNSPEC, addr_family)
+        ]
+        if not results:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return results
+
+    def pin(self, host, address, family=socket.AF_INET):
+        """Answers host with a fixed address from now on, like a hosts file entry (never refreshed)."""
+        self._entries[host] = DNSCacheEntry([(family, address)], None, float('inf'))
+
+    async def prewarm(self, hosts):
+        """Resolves all given hosts concurrently."""
+        await asyncio.gather(*(self.lookup(host) for host in hosts))
+
+    async def refresh_forever(self, get_hosts):
+        """Keeps every host returned by get_hosts() resolved, refreshing ahead of expiry.
+
+        Other hosts (dropped by a site list reload, or probed by a batch job) are evicted, so
+        the cache and failed_hosts() only cover the monitored sites. Pinned hosts are kept.
+        """
+        while True:
+            now = time.monotonic()
+            hosts = get_hosts()
+            # Snapshot of the keys: lookups on other loops may add entries meanwhile
+            for host in list(self._entries):
+                entry = self._entries.get(host)
+                if host not in hosts and entry is not None and entry.ttl != float('inf'):
+                    self._entries.pop(host, None)
+            due = [host for host in hosts
+                   if host not in self._entries or self._needs_refresh(self._entries[host], now)]
+            if due:
+                await self.prewarm(due)
+            await asyncio.sleep(DNS_REFRESH_INTERVAL)
+
+    def failed_hosts(self):
+        """Hosts whose last lookup failed (DNS broken, as opposed to the site being down)."""
+        return [host for host, entry in self._entries.items() if entry.error is not None]
+
+    async def close(self):
+        pass
+
+
+def parse_endpoint(endpoint):
+    """Returns (host, port) from a "host:port" string or a (host, port) pair."""
+    if isinstance(endpoint, str):
+        host, _, port = endpoint.rpartition(':')
+        return host.strip('[]'), int(port)
+    host, port = endpoint
+    return host, int(port)
+
+
+def infer_local_outage(results):
+    """True if most unrelated domains in a sweep got no answer at all (the problem is on our side).
+
+    Sites are grouped by registrable domain, since hosts of one domain usually share servers;
+    a domain counts as unreachable only if none of its sites got any response.
+    """
+    unreachable = {}
+    for r in results:
+        host = urlsplit(r['url']).hostname
+        domain = registrable_domain(host) if host else r['url']
+        failed = not r['success'] and r.get('error_class') in TRANSPORT_ERROR_CLASSES
+        unreachable[domain] = unreachable.get(domain, True) and failed
+    if len(unreachable) < OUTAGE_MIN_DOMAINS:
+        return all(unreachable.values())
+    return sum(unreachable.values()) > len(unreachable) * OUTAGE_DOMAIN_SHARE
+
+
+def _retrieve_exception(task):
+    if not task.cancelled():
+        task.exception()
+
+
+class ConnectivityChecker:
+    """Internet reachability, checked by racing TCP connects to several reference endpoints.
+
+    The first endpoint to accept a connection settles the check; it fails only if all of
+    them do. The verdict is cached for ttl seconds and concurrent callers share one check.
+    """
+
+    def __init__(self, endpoints=NETWORK_ENDPOINTS, timeout=NETWORK_TIMEOUT, ttl=NETWORK_CHECK_TTL):
+        self.endpoints = [parse_endpoint(endpoint) for endpoint in endpoints]
+        self.timeout = timeout
+        self.ttl = ttl
+        self.reachable = None
+        self.checked_at = None
+        self._pending = None
+
+    async def _connect(self, host, port):
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=self.timeout)
+        writer.close()
+
+    async def _race(self):
+        tasks = [asyncio.ensure_future(self._connect(host, port)) for host, port in self.endpoints]
+        try:
+            for future in asyncio.as_completed(tasks):
+                try:
+                    await future
+                    return True
+                except (OSError, asyncio.TimeoutError):
+                    continue
+            return False
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                # A cancelled connect can still end with its own error; retrieve it so it isn't logged
+                task.add_done_callback(_retrieve_exception)
+
+    async def check(self):
+        if self.checked_at is not None and time.monotonic() - self.checked_at < self.ttl:
+            return self.reachable
+        pending = self._pending
+        if pending is None or pending.done() or pending.get_loop() is not asyncio.get_running_loop():
+            pending = self._pending = asyncio.ensure_future(self._race())
+        # Shielded so one caller giving up doesn't cancel the check others wait on
+        reachable = await asyncio.shield(pending)
+        self.reachable = reachable
+        self.checked_at = time.monotonic()
+        return reachable
+
+
+# Marks the end of a sweep on the queue behind WebsiteMonitor.iter_check
+_SWEEP_DONE = object()
+
+
+class WebsiteMonitor:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, limit_per_host=LIMIT_PER_HOST, rate_limits=None, history=None,
+                 probe_strategy=DEFAULT_PROBE_STRATEGY, network_endpoints=None):
+        self.sites = SiteRegistry(strategies=PROBE_STRATEGIES)
+        # Probe strategy overrides per URL (set_probe_strategy); otherwise the site's own
+        # strategy from the site list, then probe_strategy
+        self.probe_strategy = probe_strategy
+        self.probe_strategies = {}
+        # Optional history.HistoryStore; every sweep's results are written to it in one batch
+        self.history = history
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.rate_limiter = HostRateLimiter(overrides=rate_limits)
+        self.timeout_policy = AdaptiveTimeoutPolicy()
+        self.dns_cache = CachingResolver()
+        self.connectivity = ConnectivityChecker(network_endpoints or NETWORK_ENDPOINTS)
+        # Whether the last finished sweep was a local network outage (see iter_check_async)
+        self.network_error = False
+        # Page fingerprints of sites probed with the 'content' strategy
+        self.content_baselines = ContentBaselines()
+        # ETag / Last-Modified per URL, sent back so unchanged pages answer with a bodyless 304
+        self.validators = ValidatorCache()
+
+        # One pooled client per event loop (aiohttp sessions are bound to their loop)
+        self._session = None
+        self._session_loop = None
+        self._semaphore = None
+        # Probe attempts waiting for a rate-limit token or a concurrency slot, and those running
+        self.queued = 0
+        self.in_flight = 0
+
+        # Private loop used by the synchronous wrappers (tray app, Flet app)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def urls(self):
+        """{name: url} of the loaded sites, in file order."""
+        return self.sites.urls()
+
+    @urls.setter
+    def urls(self, urls):
+        self.sites.load_dict(urls)
 
     def load_urls(self, file_path):
-        """Loads URLs from the specified text file."""
-        self.urls = {}
+        """Loads sites from a site list file (text "name url [strategy]" lines, or CSV/JSON/YAML)."""
+        self.sites.load(file_path)
+        self._log_duplicates()
+
+    def reload_urls(self):
+        """Reloads the site list if its file changed on disk; returns True if it did."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        except UnicodeDecodeError:
-            with open(file_path, 'r', encoding='cp949') as f:
-                lines = f.readlines()
-        except FileNotFoundError:
-            pass
-        
-        for line in lines:
-            parts = line.split()
-            if len(parts) >= 2:
-                name = parts[0]
-                url = parts[1].strip()
-                self.urls[name] = url
+            changed = self.sites.reload_if_changed()
+        except (OSError, ValueError) as e:
+            # Keep monitoring the previous list rather than nothing
+            self.log_error(f"Site list reload failed: {e}")
+            return False
+        if changed:
+            self._log_duplicates()
+        return changed
+
+    def _log_duplicates(self):
+        if self.sites.duplicates:
+            self.log_error(f"Duplicate site names in {self.sites.path}: {', '.join(self.sites.duplicates)}")
+
+    def get_hosts(self):
+        """Returns the set of hostnames of the loaded URLs."""
+        return self.sites.hosts()
+
+    async def prewarm_dns_async(self):
+        """Pre-resolves every monitored host so the first sweep doesn't wait on DNS."""
+        await self.dns_cache.prewarm(self.get_hosts())
+
+    def start_dns_refresh(self):
+        """Starts pre-resolving and refreshing hosts on the private loop (non-blocking)."""
+        self._submit(self.dns_cache.refresh_forever(self.get_hosts))
+
+    def set_probe_strategy(self, url, strategy):
+        """Sets how a URL is probed (one of PROBE_STRATEGIES)."""
+        if strategy not in PROBE_STRATEGIES:
+            raise ValueError(f"Unknown probe strategy: {strategy}")
+        self.probe_strategies[url] = strategy
 
     def get_urls(self):
         """Returns the dictionary of URLs."""
         return self.urls
 
-    def check_site(self, url):
-        """Checks a single URL with a retry mechanism. Disables SSL verification."""
-        # Use minimal headers that were proven to work in debug_site.py
-        # Avoid Referer/Origin/Sec-Fetch headers as they cause 400 Bad Request on goedy.kr
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Connection': 'keep-alive'
+    def _strategy_for(self, url):
+        strategy = self.probe_strategies.get(url)
+        if strategy is None:
+            site = self.sites.by_url(url)
+            if site is None:
+                strategy = self.probe_strategy
+            else:
+                # Required keywords can only be checked in the page content
+                strategy = site.strategy or ('content' if site.keywords else self.probe_strategy)
+        return strategy
+
+    async def _get_session(self):
+        """Returns the long-lived pooled client for the running loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.limit_per_host,
+                # verify=False equivalent: handles sites with self-signed or local government certs
+                ssl=make_ssl_context(),
+                keepalive_timeout=60,
+                # Our resolver does the caching, with real TTLs and background refresh
+                resolver=self.dns_cache,
+                use_dns_cache=False,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=DEFAULT_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                trace_configs=[make_trace_config()],
+            )
+            self._session_loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    def pool_stats(self):
+        """Returns live load figures: queued and in-flight probes, probe slots, pooled connections."""
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        # aiohttp keeps no public counters; _acquired holds busy connections, _conns idle ones per host
+        active = len(getattr(connector, '_acquired', ())) if connector is not None else 0
+        idle = sum(len(conns) for conns in getattr(connector, '_conns', {}).values()) if connector is not None else 0
+        return {
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'slots': self.max_concurrency,
+            'connections_active': active,
+            'connections_idle': idle,
         }
-        
-        def translate_error(error_msg):
-            msg = str(error_msg).lower()
-            if "name or service not known" in msg or "getaddrinfo failed" in msg:
-                return "사이트 주소(도메인)를 찾을 수 없습니다."
-            if "connect" in msg and "refused" in msg:
-                return "사이트 연결이 거부되었습니다. (서버 다운 추정)"
-            if "timed out" in msg or "timeout" in msg:
-                return "응답 시간이 초과되었습니다. (접속 지연)"
-            if "ssl" in msg or "certificate" in msg:
-                return "보안 인증서 오류가 발생했습니다."
-            if "404" in msg:
-                return "페이지를 찾을 수 없습니다. (404 Not Found)"
-            if "400" in msg:
-                return "잘못된 요청(400): 방화벽 차단 의심 (재시도 중)"
-            if "500" in msg:
-                return "서버 내부 오류입니다. (500 Internal Server Error)"
-            if "502" in msg or "503" in msg:
-                return "서버가 일시적으로 사용 불가능합니다. (502/503)"
-            return f"접속 실패: {error_msg}"
 
-        try:
-            session = requests.Session()
-            # verify=False handles sites with self-signed or local government certs
-            response = session.get(url, timeout=15, verify=False, headers=headers)
+    async def aclose(self):
+        """Closes the pooled client of the running loop."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    def close(self):
+        """Closes the pooled client used by the synchronous wrappers."""
+        if self._loop is not None:
+            self._run_sync(self.aclose())
+
+    async def _fetch(self, session, url, marks, strategy, timeout, conditional=True):
+        """Performs a single probe request, raises on HTTP error status and returns
+        (status code, bytes read, PageFingerprint or None)."""
+        # Content probes need the page itself, so they never ask for a 304
+        conditional = conditional and strategy != 'content'
+        headers = self.validators.headers_for(url) if conditional else None
+        if strategy == 'head':
+            async with session.head(url, allow_redirects=True, timeout=timeout, trace_request_ctx=marks,
+                                    headers=headers) as response:
+                marks['finished'] = time.monotonic()
+                # Some portals and WAFs reject HEAD outright; only a GET can tell if they are really down
+                if response.status < 400:
+                    if conditional:
+                        self.validators.update(url, response.status, response.headers)
+                    return response.status, 0, None
+            marks.clear()
+            strategy = 'stream'
+
+        async with session.get(url, timeout=timeout, trace_request_ctx=marks, headers=headers) as response:
+            if response.status == 304:
+                # Unchanged since the last probe: the application answered and there is nothing to
+                # download, so the connection goes back to the pool instead of being dropped
+                marks['finished'] = time.monotonic()
+                if conditional:
+                    self.validators.update(url, response.status, response.headers)
+                return response.status, 0, None
+            if strategy == 'content':
+                response.raise_for_status()
+                # Hash the page chunk by chunk; the body itself is never held in memory
+                site = self.sites.by_url(url)
+                fingerprint = PageFingerprint(site.keywords if site is not None else (), response.charset)
+                async for chunk in response.content.iter_chunked(CONTENT_CHUNK_BYTES):
+                    fingerprint.feed(chunk)
+                    if fingerprint.size >= CONTENT_MAX_BYTES:
+                        response.close()
+                        break
+                fingerprint.close()
+                marks['finished'] = time.monotonic()
+                return response.status, fingerprint.size, fingerprint
+            if strategy == 'full':
+                body = await response.read()
+                size = len(body)
+            else:
+                # Only confirm the application started sending the page, then drop the connection
+                size = len(await response.content.read(PARTIAL_BODY_BYTES))
+                response.close()
+            marks['finished'] = time.monotonic()
             response.raise_for_status()
-            return True, None
-        except requests.RequestException:
-            # Retry once
+            if conditional:
+                self.validators.update(url, response.status, response.headers)
+            return response.status, size, None
+
+    async def _attempt(self, session, url, marks, timeout, strategy, rate_limiter, conditional):
+        """Waits for the host's rate limit, then probes within the global concurrency cap."""
+        # Wait for the host token outside the semaphore so throttled hosts don't hold slots
+        self.queued += 1
+        queued = True
+        try:
+            await rate_limiter.acquire(url)
+            async with self._semaphore:
+                self.queued -= 1
+                queued = False
+                self.in_flight += 1
+                _phase_marks.set(marks)
+                try:
+                    return await self._fetch(session, url, marks, strategy, timeout, conditional)
+                finally:
+                    self.in_flight -= 1
+                    marks.setdefault('finished', time.monotonic())
+        finally:
+            if queued:
+                self.queued -= 1
+
+    async def probe_async(self, url, policy=None, rate_limiter=None, adhoc=False):
+        """Checks a single URL with adaptive timeouts and retries and returns a structured result dict.
+
+        Ad-hoc URLs (batch jobs) pass adhoc=True with their own timeout policy and rate
+        limiter, so they neither spend the monitored sites' retry budget and host tokens
+        nor add to their latency statistics, validators or content baselines; they are
+        probed with the monitor's default strategy and timeout even if they are in the site list.
+
+        Keys: success, error, error_class, status_code, size (body bytes read), retries,
+        timeout (seconds allowed for the last attempt), timings (see phase_timings, for
+        the last attempt), latency_ms (its total_ms), checked_at (epoch seconds), content
+        (ContentBaselines.compare result for 'content' probes, else None) and not_modified
+        (the page answered 304 to a conditional request: healthy, and unchanged).
+        """
+        session = await self._get_session()
+        policy = policy or self.timeout_policy
+        rate_limiter = rate_limiter or self.rate_limiter
+        site = None if adhoc else self.sites.by_url(url)
+        if adhoc:
+            # No baseline to compare an ad-hoc page with
+            strategy = DEFAULT_PROBE_STRATEGY if self.probe_strategy == 'content' else self.probe_strategy
+        else:
+            strategy = self._strategy_for(url)
+        limit = site.timeout if site is not None and site.timeout else REQUEST_TIMEOUT
+        checked_at = time.time()
+        policy.record_request()
+        attempt = 0
+        while True:
+            marks = {}
+            timeout = policy.timeout_for(url, attempt, limit)
             try:
-                session = requests.Session()
-                response = session.get(url, timeout=15, verify=False, headers=headers)
-                response.raise_for_status()
-                return True, None
-            except requests.RequestException as e:
-                return False, translate_error(str(e))
+                # Validators are kept for monitored sites only, so other URLs can't evict theirs
+                status_code, size, fingerprint = await self._attempt(session, url, marks, timeout, strategy,
+                                                                     rate_limiter, site is not None)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not policy.can_retry(attempt):
+                    timings = phase_timings(marks)
+                    return {
+                        'success': False,
+                        'error': translate_error(describe_exception(e)),
+                        'error_class': classify_error(e),
+                        'status_code': getattr(e, 'status', None),
+                        'size': None,
+                        'retries': attempt,
+                        'timeout': timeout.total,
+                        'timings': timings,
+                        'latency_ms': timings['total_ms'],
+                        'checked_at': checked_at,
+                        'content': None,
+                        'not_modified': False,
+                    }
+                attempt += 1
+                await asyncio.sleep(policy.backoff(attempt))
+
+        timings = phase_timings(marks)
+        policy.observe(url, timings)
+
+        # A page that loads but no longer looks like itself (defaced, maintenance notice) fails
+        error = None
+        content = None
+        if fingerprint is not None:
+            content = self.content_baselines.compare(url, fingerprint)
+            if content['changed']:
+                error = f"페이지 내용이 평소와 크게 다릅니다 (Content changed: {content['distance']}/64 bits)"
+            elif content['missing_keywords']:
+                error = f"필수 키워드가 없습니다 (Missing keywords: {', '.join(content['missing_keywords'])})"
+        return {
+            'success': error is None,
+            'error': error,
+            'error_class': None if error is None else 'content',
+            'status_code': status_code,
+            'size': size,
+            'retries': attempt,
+            'timeout': timeout.total,
+            'timings': timings,
+            'latency_ms': timings['total_ms'],
+            'checked_at': checked_at,
+            'content': content,
+            'not_modified': status_code == 304,
+        }
+
+    async def check_site_async(self, url):
+        """Checks a single URL with a retry mechanism, reusing pooled connections."""
+        result = await self.probe_async(url)
+        return result['success'], result['error']
+
+    def check_site(self, url):
+        """Checks a single URL with a retry mechanism. Disables SSL verification."""
+        return self._run_sync(self.check_site_async(url))
+
+    def probe(self, url):
+        """Synchronous probe_async, for the tray and Flet apps."""
+        return self._run_sync(self.probe_async(url))
 
     def check_network(self):
-        """Checks intenet connectivity by connecting to Google DNS."""
-        import socket
+        """Checks internet connectivity (see ConnectivityChecker)."""
+        return self._run_sync(self.check_network_async())
+
+    async def check_network_async(self):
+        """True if any reference endpoint is reachable; raced, and cached for NETWORK_CHECK_TTL."""
+        return await self.connectivity.check()
+
+    def start_network_check(self):
+        """Starts check_network in the background; returns a future, for sync callers that probe meanwhile."""
+        return self._submit(self.check_network_async())
+
+    def is_network_outage(self, reachable, results):
+        """Decides after a sweep whether its failures are a local outage rather than the sites' own."""
+        return not reachable and infer_local_outage(results)
+
+    def log_error(self, message, **fields):
+        """Logs an error to the JSON-lines check log (see checklog.RECORD_FIELDS for fields).
+
+        Records go through a queue to a single writer thread, so this never waits on disk.
+        """
+        get_logger().error(message, extra={'fields': fields})
+
+    def save_caches(self):
+        """Writes the content baselines and HTTP validators if they changed (errors are logged)."""
         try:
-            # Connect to Google DNS on port 53 (DNS)
-            socket.create_connection(("8.8.8.8", 53), timeout=3)
-            return True
-        except OSError:
-            return False
+            self.content_baselines.save()
+        except OSError as e:
+            self.log_error(f"Content baselines save failed: {e}")
+        try:
+            self.validators.save()
+        except OSError as e:
+            self.log_error(f"Validator cache save failed: {e}")
+
+    async def iter_check_async(self, sites=None, others=None, save=True):
+        """Probes all loaded sites (or the given Site objects) concurrently and yields each
+        result as soon as it completes.
+
+        others, for a batch of a few sites, holds the latest results of the rest of the list:
+        a local outage is judged over all of them, not over one or two sites. With save=False
+        the caller writes the caches (save_caches) on its own schedule.
+        """
+        # The connectivity check runs alongside the probes; it only matters once they are done
+        network = asyncio.ensure_future(self.check_network_async())
 
-    def log_error(self, message):
-        """Appends an error message to the log file with a timestamp."""
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
+        async def check_single_url(site):
+            result = await self.probe_async(site.url)
+            result['id'] = site.id
+            result['name'] = site.name
+            result['url'] = site.url
+            return result
+
+        # Every site starts at once: the per-host token buckets keep WAF-protected hosts
+        # from being hammered, and the global semaphore and per-host connection limit bound
+        # resource use, so thousands of URLs cost coroutines rather than threads.
+        tasks = [asyncio.ensure_future(check_single_url(site)) for site in (self.sites if sites is None else sites)]
+        completed = []
         try:
-            with open("check_error.log", "a", encoding="utf-8") as f:
-                f.write(log_entry)
-        except Exception:
-            pass
-
-    def run_check(self):
-        """Checks all loaded URLs in parallel and returns failed sites."""
-        import concurrent.futures
-        
+            for future in asyncio.as_completed(tasks):
+                result = await future
+                if not result['success']:
+                    self.log_error(f"Site Fail: {result['name']} ({result['url']}) - {result['error']}",
+                                   event='site_fail', site_id=result['id'], site=result['name'], url=result['url'],
+                                   latency_ms=result['latency_ms'], error_class=result['error_class'],
+                                   status_code=result['status_code'])
+                completed.append(result)
+                yield result
+
+            self.network_error = self.is_network_outage(await network, completed if others is None else [*others, *completed])
+            if self.network_error:
+                self.log_error("Network Error: Cannot connect to internet (reference endpoints and most sites unreachable).",
+                               event='network_error')
+            elif self.history is not None:
+                # One batched write per sweep, off the event loop; an outage on our side
+                # says nothing about the sites, so it isn't recorded against them
+                await asyncio.to_thread(self.history.record_sweep, completed)
+            if save:
+                await asyncio.to_thread(self.save_caches)
+        finally:
+            # The consumer may stop early (e.g. a streaming client disconnected)
+            network.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def run_check_async(self, on_result=None):
+        """Checks all loaded URLs concurrently on the pooled client and returns failed sites.
+
+        'results' holds the full probe result (timings, status, size) of every site.
+        on_result, if given, is called with each result as soon as it completes.
+        """
         failed_sites = []
-        is_network_up = self.check_network()
-
-        if not is_network_up:
-            self.log_error("Network Error: Cannot connect to internet (Google DNS check failed).")
-            return {'network_error': True, 'failed_sites': []}
-
-        # Helper function for threading
-        def check_single_url(item):
-            name, url = item
-            success, error = self.check_site(url)
-            return name, url, success, error
-
-        # Run checks in parallel
-        # Reduced max_workers to 5 to avoid WAF blocking (rate limiting)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_url = {executor.submit(check_single_url, item): item for item in self.urls.items()}
-            
-            for future in concurrent.futures.as_completed(future_to_url):
-                name, url, success, error = future.result()
-                if not success:
-                    self.log_error(f"Site Fail: {name} ({url}) - {error}")
-                    failed_sites.append({'name': name, 'url': url, 'error': error})
-
-        return {'network_error': False, 'failed_sites': failed_sites}
+        results = []
+
+        async for result in self.iter_check_async():
+            results.append(result)
+            if not result['success']:
+                failed_sites.append({'name': result['name'], 'url': result['url'], 'error': result['error']})
+            if on_result is not None:
+                on_result(result)
+
+        if self.network_error:
+            return {'network_error': True, 'failed_sites': [], 'results': results}
+        return {'network_error': False, 'failed_sites': failed_sites, 'results': results}
+
+    def run_check(self, on_result=None):
+        """Checks all loaded URLs in parallel and returns failed sites.
+
+        on_result is called (from the monitor's background thread) with each site's result.
+        """
+        return self._run_sync(self.run_check_async(on_result))
+
+    def iter_check(self):
+        """Synchronous iter_check_async for GUI threads: yields each site's result as soon as it completes."""
+        results = queue.Queue()
+
+        async def pump():
+            try:
+                async for result in self.iter_check_async():
+                    results.put(result)
+            finally:
+                results.put(_SWEEP_DONE)
+
+        future = self._submit(pump())
+        try:
+            while True:
+                result = results.get()
+                if result is _SWEEP_DONE:
+                    break
+                yield result
+            # Surface errors raised inside the sweep
+            future.result()
+        finally:
+            future.cancel()
+
+    def _submit(self, coro):
+        """Schedules a coroutine on the monitor's private background loop and returns its future."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _run_sync(self, coro):
+        """Runs a coroutine on the monitor's private background loop and waits for it."""
+        return self._submit(coro).result()
 
 if __name__ == "__main__":
     # Test run
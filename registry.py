@@ -0,0 +1,254 @@
+import csv
+import functools
+import json
+import os
+import sys
+from urllib.parse import urlsplit
+
+try:
+    import yaml
+except ImportError:
+    # Optional: only needed to import .yaml/.yml site lists
+    yaml = None
+
+# Columns understood in CSV/JSON/YAML site lists (only name and url are required)
+SITE_FIELDS = ('id', 'name', 'url', 'region', 'tags', 'strategy', 'timeout', 'interval', 'keywords')
+
+
+@functools.lru_cache(maxsize=65536)
+def _hostname(netloc):
+    # Cached per netloc: large lists repeat a few thousand hosts, and urlsplit dominates loading
+    return urlsplit('//' + netloc).hostname
+
+
+class Site:
+    """One monitored site. Slotted, so 100k sites stay a few tens of MB."""
+
+    __slots__ = ('id', 'name', 'url', 'host', 'region', 'tags', 'strategy', 'timeout', 'interval', 'keywords')
+
+    def __init__(self, id, name, url, region=None, tags=(), strategy=None, timeout=None, keywords=(), interval=None):
+        self.id = id
+        self.name = name
+        self.url = url
+        self.host = _hostname(url.partition('://')[2].partition('/')[0])
+        self.region = sys.intern(region) if region else None
+        self.tags = tuple(sys.intern(tag) for tag in tags)
+        # Per-site probe config; None falls back to the monitor's defaults
+        self.strategy = strategy
+        self.timeout = timeout
+        # Seconds between probes in daemon mode (see daemon.ProbeScheduler)
+        self.interval = interval
+        # Words the page must contain (checked by the 'content' probe strategy)
+        self.keywords = keywords
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"Site({self.id}, {self.name!r}, {self.url!r})"
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(path, 'r', encoding='cp949') as f:
+            return f.read()
+
+
+def _parse_list(value):
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.replace('|', ';').split(';')
+    return tuple(tag.strip() for tag in value if tag and tag.strip())
+
+
+def _parse_records(path, text):
+    """Returns a list of site dicts from a site list file, by extension.
+
+    Raises ValueError (with a user-facing message) if the file can't be parsed, so a
+    broken edit is reported and the previous list kept.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        try:
+            return list(csv.DictReader(text.splitlines()))
+        except csv.Error as e:
+            raise ValueError(f"CSV 사이트 목록을 읽을 수 없습니다: {path}: {e}")
+    if ext in ('.json', '.yaml', '.yml'):
+        if ext == '.json':
+            data = json.loads(text)
+        elif yaml is None:
+            raise ValueError(f"YAML 사이트 목록을 읽으려면 PyYAML이 필요합니다: {path}")
+        else:
+            try:
+                data = yaml.safe_load(text)
+            except yaml.YAMLError as e:
+                raise ValueError(f"YAML 사이트 목록을 읽을 수 없습니다: {path}: {e}")
+        if isinstance(data, dict):
+            data = data.get('sites', [])
+        if not isinstance(data, list) or not all(isinstance(record, dict) for record in data):
+            raise ValueError(f"사이트 목록 형식이 올바르지 않습니다: {path}")
+        return data
+
+    # Plain text: "name url [strategy]" per line, whitespace separated
+    records = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            records.append({'name': parts[0], 'url': parts[1], 'strategy': parts[2] if len(parts) >= 3 else None})
+    return records
+
+
+class SiteRegistry:
+    """Indexed set of monitored sites, loaded from a text/CSV/JSON/YAML site list.
+
+    Sites keep their numeric id across reloads as long as their name is unchanged, so
+    dashboards and history can key on it. An explicit "id" column overrides this.
+    Duplicate names no longer overwrite each other: an identical entry is dropped and
+    a same-named site with a different URL gets a "(2)" suffix. Both are listed in
+    `duplicates`. Indexes are rebuilt on load and swapped in, never mutated, so
+    readers on other threads always see a complete list.
+    """
+
+    def __init__(self, strategies=None):
+        # Accepted probe strategy names; other values in the strategy column are ignored
+        self.strategies = strategies
+        self.path = None
+        self.duplicates = []
+        self._stat = None
+        self._ids = {}
+        self._next_id = 1
+        self._sites = ()
+        self._by_id = {}
+        self._by_name = {}
+        self._by_url = {}
+        self._by_host = {}
+        self._urls = {}
+
+    def __len__(self):
+        return len(self._sites)
+
+    def __iter__(self):
+        return iter(self._sites)
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, path):
+        """Loads a site list file; a missing file gives an empty registry that fills in once it appears."""
+        self.path = path
+        self._stat = self._file_stat()
+        if self._stat is None:
+            self.load_records([])
+            return
+        self.load_records(_parse_records(path, _read_text(path)))
+
+    def reload_if_changed(self):
+        """Reloads the file if its mtime or size changed since the last load; returns True if it did."""
+        if self.path is None or self._file_stat() == self._stat:
+            return False
+        self.load(self.path)
+        return True
+
+    def load_dict(self, urls):
+        """Replaces the sites with a plain {name: url} dict."""
+        self.load_records([{'name': name, 'url': url} for name, url in urls.items()])
+
+    def load_records(self, records):
+        """Replaces the sites with the given dicts (see SITE_FIELDS)."""
+        sites = []
+        by_id = {}
+        by_name = {}
+        duplicates = []
+
+        for record in records:
+            name = str(record.get('name') or '').strip()
+            url = str(record.get('url') or '').strip()
+            if not name or not url:
+                continue
+
+            existing = by_name.get(name)
+            if existing is not None:
+                duplicates.append(name)
+                if existing.url == url:
+                    continue
+                n = 2
+                while f"{name} ({n})" in by_name:
+                    n += 1
+                name = f"{name} ({n})"
+
+            site_id = record.get('id')
+            site_id = int(site_id) if site_id not in (None, '') else None
+            if site_id is None or site_id in by_id:
+                site_id = self._ids.get(name)
+            if site_id is None or site_id in by_id:
+                site_id = None
+
+            strategy = record.get('strategy') or None
+            if self.strategies is not None and strategy not in self.strategies:
+                strategy = None
+            timeout = record.get('timeout')
+            interval = record.get('interval')
+
+            site = Site(site_id, name, url, record.get('region'), _parse_list(record.get('tags')),
+                        strategy, float(timeout) if timeout not in (None, '') else None,
+                        _parse_list(record.get('keywords')), float(interval) if interval not in (None, '') else None)
+            sites.append(site)
+            by_name[name] = site
+            if site_id is not None:
+                by_id[site_id] = site
+
+        # New sites are numbered after every id handed out so far
+        next_id = max([self._next_id - 1, *by_id]) + 1
+        for site in sites:
+            if site.id is None:
+                site.id = next_id
+                by_id[next_id] = site
+                next_id += 1
+        self._next_id = next_id
+
+        by_host = {}
+        for site in sites:
+            by_host.setdefault(site.host, []).append(site)
+
+        for site in sites:
+            self._ids[site.name] = site.id
+        self.duplicates = duplicates
+        self._sites = tuple(sites)
+        self._by_id = by_id
+        self._by_name = by_name
+        self._by_url = {site.url: site for site in sites}
+        self._by_host = {host: tuple(group) for host, group in by_host.items()}
+        self._urls = {site.name: site.url for site in sites}
+
+    def get(self, site_id):
+        return self._by_id.get(site_id)
+
+    def by_name(self, name):
+        return self._by_name.get(name)
+
+    def by_url(self, url):
+        return self._by_url.get(url)
+
+    def by_host(self):
+        """Returns {host: (sites, ...)}, for work that should share a connection or rate limit."""
+        return self._by_host
+
+    def hosts(self):
+        return self._by_host.keys() - {None}
+
+    def urls(self):
+        """Returns {name: url} in file order (shared; don't mutate)."""
+        return self._urls
+
+    def select(self, tag=None, region=None):
+        """Returns the sites carrying a tag and/or in a region."""
+        return [site for site in self._sites
+                if (tag is None or tag in site.tags) and (region is None or site.region == region)]
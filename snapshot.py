@@ -0,0 +1,48 @@
+import json
+import time
+from atomicfile import atomic_write_json
+
+SNAPSHOT_FILE = 'last_sweep.json'
+SNAPSHOT_VERSION = 1
+
+# Probe result fields kept per site; timings and content details are left out to keep it small
+SNAPSHOT_FIELDS = ('id', 'name', 'url', 'success', 'error', 'error_class', 'status_code', 'latency_ms', 'checked_at')
+
+
+def save_snapshot(results, network_error=False, states=None, path=SNAPSHOT_FILE):
+    """Writes the last sweep's results (and each site's alert state, if given) atomically.
+
+    Rows are stored as lists under a single field header, which keeps large site lists compact.
+    """
+    states = states or {}
+    data = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': time.time(),
+        'network_error': network_error,
+        'fields': SNAPSHOT_FIELDS + ('state',),
+        'results': [[r.get(field) for field in SNAPSHOT_FIELDS] + [states.get(r['name'])] for r in results],
+    }
+    atomic_write_json(path, data, separators=(',', ':'))
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """Returns the saved snapshot, or None if there is none (or it is unreadable).
+
+    Keys: saved_at, age (seconds), network_error, results (dicts with SNAPSHOT_FIELDS and
+    'state'; every result is marked 'stale': True, since it comes from an earlier run).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != SNAPSHOT_VERSION:
+            return None
+        fields = data['fields']
+        results = [dict(zip(fields, row), stale=True) for row in data['results']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return {
+        'saved_at': data['saved_at'],
+        'age': time.time() - data['saved_at'],
+        'network_error': data.get('network_error', False),
+        'results': results,
+    }
@@ -1,18 +1,27 @@
 
-import pystray
-from PIL import Image, ImageDraw
 import threading
 import time
 import json
 import tkinter as tk
-from tkinter import simpledialog, messagebox
 import os
-from plyer import notification
 from monitor import WebsiteMonitor
+from history import HistoryStore
+from alerts import AlertEngine, DOWN, RECOVERING, SUSPECT
+from daemon import daemon_client, CLIENT_POLL_SECONDS
+from snapshot import save_snapshot, load_snapshot
+import checklog
 
 SETTINGS_FILE = 'settings.json'
 URL_FILE = '지역교육청_url.txt'
 
+# Notification per alert kind (see alerts.AlertEngine): title, message prefix
+ALERT_NOTIFICATIONS = {
+    'down': ("Website Failure", "Failed"),
+    'reminder': ("Website Still Down", "Still failing"),
+    'flapping': ("Website Unstable", "Going up and down"),
+    'recovered': ("Website Recovered", "Back up"),
+}
+
 class ProgressWindow:
     def __init__(self, monitor, on_close_callback, master):
         self.monitor = monitor
@@ -37,6 +46,7 @@ class ProgressWindow:
 
         self.urls = self.monitor.get_urls()
         self.failed_sites = []
+        self.results = []
         self.network_error = False
         
         # Start checking automatically
@@ -47,28 +57,27 @@ class ProgressWindow:
         threading.Thread(target=self.run_check_process, daemon=True).start()
 
     def run_check_process(self):
-        # 1. Check Network
-        self.update_status("Checking Network...", "blue")
-        if not self.monitor.check_network():
-            self.network_error = True
-            self.update_status("Network Error!", "red")
-            self.add_log("Network: FAIL (Ping 8.8.8.8)")
-            self.finish_check()
-            return
-
-        self.add_log("Network: OK")
-        
-        # 2. Check Sites
+        # Check Sites (all in parallel; results arrive in completion order). The network
+        # check runs alongside them and is decided once they are done.
         total = len(self.urls)
-        for i, (name, url) in enumerate(self.urls.items()):
-            self.update_status(f"Checking {name} ({i+1}/{total})...", "black")
-            success, error = self.monitor.check_site(url)
-            
-            if success:
-                self.add_log(f"[OK] {name} - {url}")
+        self.update_status(f"Checking {total} sites...", "black")
+        for i, probe in enumerate(self.monitor.iter_check(), 1):
+            name, url = probe['name'], probe['url']
+            self.update_status(f"Checked {name} ({i}/{total})...", "black")
+            latency = f"{probe['latency_ms']:.0f}ms" if probe['latency_ms'] is not None else "-"
+            self.results.append(probe)
+
+            if probe['success']:
+                self.add_log(f"[OK] {name} - {url} ({latency})")
             else:
-                self.add_log(f"[FAIL] {name} - {url} - {error}")
-                self.failed_sites.append({'name': name, 'url': url, 'error': error})
+                self.add_log(f"[FAIL] {name} - {url} - {probe['error']} ({latency})")
+                self.failed_sites.append({'name': name, 'url': url, 'error': probe['error'], 'probe': probe})
+
+        if self.monitor.network_error:
+            self.network_error = True
+            self.failed_sites = []
+            self.update_status("Network Error!", "red")
+            self.add_log("Network: FAIL (reference endpoints and most sites unreachable)")
         
         self.finish_check()
 
@@ -88,10 +97,10 @@ class ProgressWindow:
     def finish_check(self):
         if self.network_error or self.failed_sites:
             self.update_status("Check Completed: Issues Found", "red")
-            result = {'network_error': self.network_error, 'failed_sites': self.failed_sites}
+            result = {'network_error': self.network_error, 'failed_sites': self.failed_sites, 'results': self.results}
         else:
             self.update_status("Check Completed: All Good", "green")
-            result = {'network_error': False, 'failed_sites': []}
+            result = {'network_error': False, 'failed_sites': [], 'results': self.results}
             # Auto close after 2 seconds if success
             try:
                 self.window.after(2000, self.on_close)
@@ -108,11 +117,24 @@ class ProgressWindow:
 
 class TrayApp:
     def __init__(self):
-        self.monitor = WebsiteMonitor()
         self.load_settings()
+        self.monitor = WebsiteMonitor(history=HistoryStore(), network_endpoints=self.settings.get('network_endpoints'))
+        # Per-site alert states, shared with the web dashboard through the state file
+        self.alerts = AlertEngine()
+        self.network_down = False
+        # With "daemon_url" in settings.json this app only shows a headless daemon's results
+        self.daemon = daemon_client(self.settings)
+        self.last_alert_time = time.time()
+        # Last known status from the previous run, shown until the first check finishes
+        self.restored = load_snapshot()
         self.icon = None
         self.running = True
+        # Set to run the next check now instead of at the end of the interval
+        self.wake = threading.Event()
+        self.check_requested = False
         self.monitor.load_urls(URL_FILE)
+        if self.daemon is None:
+            self.monitor.start_dns_refresh()
         
         # Main root window (hidden)
         self.root = tk.Tk()
@@ -141,6 +163,9 @@ class TrayApp:
             json.dump(self.settings, f, indent=4)
 
     def create_image(self, color):
+        # PIL, pystray and plyer are imported on first use (in the icon thread, or with the
+        # first notification), so they don't hold up startup and the first check
+        from PIL import Image, ImageDraw
         width = 64
         height = 64
         image = Image.new('RGB', (width, height), color)
@@ -148,29 +173,36 @@ class TrayApp:
         dc.rectangle((0, 0, width, height), fill=color)
         return image
 
+    def check_interval(self):
+        if self.daemon is not None:
+            # The daemon schedules the probes itself; this only reads its results
+            return CLIENT_POLL_SECONDS
+        return self.settings.get('interval_minutes', 10) * 60
+
     def run_scheduler(self):
         # Initial Check (wait a bit for UI to be ready)
         time.sleep(2)
-        self.trigger_check()
-        
-        last_check_time = time.time()
-        
-        while self.running:
-            interval_sec = self.settings.get('interval_minutes', 10) * 60
-            
-            if time.time() - last_check_time >= interval_sec:
-                self.trigger_check()
-                last_check_time = time.time()
-            
-            time.sleep(1)
 
-    def trigger_check(self):
+        while self.running:
+            force = self.check_requested
+            self.check_requested = False
+            self.trigger_check(force)
+            # Sleeps until the next check is due; Check Now wakes it early
+            self.wake.wait(self.check_interval())
+            self.wake.clear()
+
+    def trigger_check(self, force=False):
+        if self.daemon is None:
+            # Pick up edits to the site list file since the last check
+            self.monitor.reload_urls()
         # Dispatch check to Main Thread if needed
         # We use root.after to safely trigger UI stuff
-        self.root.after(0, self.check_websites)
+        self.root.after(0, lambda: self.check_websites(force))
 
-    def check_websites(self):
-        if self.settings.get('show_popup', True):
+    def check_websites(self, force=False):
+        if self.daemon is not None:
+            threading.Thread(target=self.run_daemon_check, args=(force,), daemon=True).start()
+        elif self.settings.get('show_popup', True):
             # Run with GUI
             self.run_popup_check()
         else:
@@ -181,6 +213,16 @@ class TrayApp:
         result = self.monitor.run_check()
         self.handle_check_result(result)
 
+    def run_daemon_check(self, force):
+        # Check Now asks the daemon to probe every site; scheduled polls read its latest results
+        try:
+            result = self.daemon.check() if force else self.daemon.status()
+        except (OSError, ValueError) as e:
+            self.monitor.log_error(f"Daemon unreachable ({self.daemon.url}): {e}")
+            self.update_icon('gray')
+            return
+        self.handle_check_result(result)
+
     def run_popup_check(self):
         # Callback wrapper to bridge GUI result back to logic
         def callback(result):
@@ -192,13 +234,51 @@ class TrayApp:
     def handle_check_result(self, result):
         if result['network_error']:
             self.update_icon('red')
-            self.show_notification("Network Error", "Cannot connect to the internet.")
-        elif result['failed_sites']:
-            self.update_icon('red')
-            failed_names = ", ".join([site['name'] for site in result['failed_sites']])
-            self.show_notification("Website Failure", f"Failed: {failed_names}")
+            # Once per outage, not on every sweep until the network is back
+            if not self.network_down:
+                self.show_notification("Network Error", "Cannot connect to the internet.")
+            self.network_down = True
+            return
+        self.network_down = False
+
+        # Notify only on confirmed state changes and reminders, not on every failed sweep
+        if 'alerts' in result:
+            # From the daemon, whose alert engine already decided; only the ones not shown yet
+            alerts = [alert for alert in result['alerts'] if alert['time'] > self.last_alert_time]
+            self.last_alert_time = max([self.last_alert_time] + [alert['time'] for alert in alerts])
+            states = {site['state'] for site in result['states'].values()}
         else:
-            self.update_icon('green')
+            results = result['results']
+            alerts = self.alerts.observe_sweep(results)
+            self.alerts.retain(r['name'] for r in results)
+            try:
+                self.alerts.save()
+            except OSError as e:
+                self.monitor.log_error(f"Alert state save failed: {e}")
+            states = {self.alerts.state_of(r['name']) for r in results}
+        self.update_icon(self.state_color(states))
+        if self.icon:
+            self.icon.title = "EduMonitor"
+
+        # Last known status for the next start (a network error sweep would only overwrite it with noise)
+        sites = result['states'] if 'states' in result else self.alerts.status()
+        try:
+            save_snapshot(result['results'], False, {name: site['state'] for name, site in sites.items()})
+        except OSError as e:
+            self.monitor.log_error(f"Snapshot save failed: {e}")
+
+        for kind, (title, prefix) in ALERT_NOTIFICATIONS.items():
+            names = [alert['site'] for alert in alerts if alert['kind'] == kind]
+            if names:
+                self.show_notification(title, f"{prefix}: {', '.join(names)}")
+
+    @staticmethod
+    def state_color(states):
+        if DOWN in states or RECOVERING in states:
+            return 'red'
+        if SUSPECT in states:
+            return 'orange'
+        return 'green'
 
     def update_icon(self, color):
         if self.icon:
@@ -209,6 +289,7 @@ class TrayApp:
 
     def show_notification(self, title, message):
         try:
+            from plyer import notification
             notification.notify(
                 title=title,
                 message=message,
@@ -219,7 +300,8 @@ class TrayApp:
             pass
 
     def on_check_now(self, icon, item):
-        self.trigger_check()
+        self.check_requested = True
+        self.wake.set()
 
     def on_settings(self, icon, item):
         # Dispatch to Main Thread
@@ -259,17 +341,29 @@ class TrayApp:
         self.running = False
         self.icon.stop()
         self.root.quit()
+        # os._exit skips atexit, so write out queued log records first
+        checklog.shutdown()
         # Ensure we really exit
         os._exit(0)
 
     def run_icon_thread(self):
-        image = self.create_image('green')
+        import pystray
+        title = "EduMonitor"
+        color = 'green'
+        if self.restored is not None:
+            # Until the first check finishes, show the last known status, marked as such
+            states = {r['state'] for r in self.restored['results']}
+            failed = self.restored['network_error'] or any(not r['success'] for r in self.restored['results'])
+            color = self.state_color(states) if states - {None} else ('red' if failed else 'green')
+            saved_at = time.strftime('%m-%d %H:%M', time.localtime(self.restored['saved_at']))
+            title = f"EduMonitor (last known status, {saved_at})"
+        image = self.create_image(color)
         menu = pystray.Menu(
             pystray.MenuItem("Check Now", self.on_check_now),
             pystray.MenuItem("Settings", self.on_settings),
             pystray.MenuItem("Exit", self.on_exit)
         )
-        self.icon = pystray.Icon("EduMonitor", image, "EduMonitor", menu)
+        self.icon = pystray.Icon("EduMonitor", image, title, menu)
         self.icon.run()
 
     def run(self):